@@ -1,12 +1,11 @@
 import pandas as pd
 import math
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 from config import Config
+from holdings_io import HoldingsStore
 
 class PerformanceAnalyzer:
     @staticmethod
-    def plot_performance(profit_df, metrics, output_path):
+    def plot_performance(profit_df, metrics, output_path, sign=None, cfg=None):
         """
         绘制:
         1. 累计净值 (Net Strategy)
@@ -14,6 +13,13 @@ class PerformanceAnalyzer:
         3. 累计超额收益 (Cumulative Excess)
         右侧显示: 核心指标 + 年度双列数据(Net/Excess)
         """
+        # 延迟导入，避免 import 本模块时初始化绘图后端
+        import matplotlib.pyplot as plt
+        import matplotlib.dates as mdates
+
+        cfg = cfg or Config()
+        sign = sign or cfg.SIGN
+
         # 设置全局字体风格
         plt.style.use('ggplot')
         
@@ -43,10 +49,10 @@ class PerformanceAnalyzer:
             ax_plot.fill_between(dates, 0, excess_cum, color='#1f77b4', alpha=0.1)
 
         # 4. 绘制策略净值 (主线)
-        ax_plot.plot(dates, net_cum, label=f'Net Strategy ({Config.STOCK_POOL})', color='#d62728', linewidth=2.5)
+        ax_plot.plot(dates, net_cum, label=f'Net Strategy ({cfg.STOCK_POOL})', color='#d62728', linewidth=2.5)
         
         # 格式设置
-        ax_plot.set_title(f"Backtest Report: {Config.SIGN}", fontsize=16, fontweight='bold', pad=20)
+        ax_plot.set_title(f"Backtest Report: {sign}", fontsize=16, fontweight='bold', pad=20)
         ax_plot.set_ylabel("Cumulative Return", fontsize=12)
         ax_plot.set_xlabel("Date", fontsize=12)
         
@@ -132,15 +138,15 @@ class PerformanceAnalyzer:
         plt.close(fig)
 
     @staticmethod
-    def analyze(data):
+    def daily_profit(data, cfg=None):
         """
-        计算回测指标并生成图表
+        计算每日收益明细: 毛收益、换手、净收益、基准、超额收益与持仓数
         """
-        print(">>> [Analysis] 开始计算绩效指标...")
+        cfg = cfg or Config()
         df = data.copy()
         
         # 确定收益列
-        ret_col = 'ret_open5twap' if Config.RET_IDX == 'open5twap' else 'ret_c2c'
+        ret_col = 'ret_open5twap' if cfg.RET_IDX == 'open5twap' else 'ret_c2c'
         
         df['TradingDay'] = pd.to_datetime(df['TradingDay'])
         
@@ -163,7 +169,7 @@ class PerformanceAnalyzer:
         profit = profit.merge(turnover_df, on='TradingDay', how='left')
         
         # origin_profit = 策略净收益 (Net Return)
-        profit['origin_profit'] = profit['net_return_rate'] - profit['turn_over'] * Config.FEE_RATE
+        profit['origin_profit'] = profit['net_return_rate'] - profit['turn_over'] * cfg.FEE_RATE
         
         # 4. Baseline
         valid_pool = df[df[ret_col].notna()].copy()
@@ -179,7 +185,18 @@ class PerformanceAnalyzer:
         # 5. 辅助列
         stock_num = df[df['weight'] > 0].groupby('TradingDay').size().reset_index(name='stock_num')
         profit = profit.merge(stock_num, on='TradingDay', how='left').fillna(0)
-        
+        return profit
+
+    @staticmethod
+    def summarize(profit, annual=True):
+        """
+        在每日收益明细上计算回撤与汇总指标
+        profit: daily_profit 的结果，也可以是其中任意一段连续区间 (walk-forward 分段复用)
+        annual: 是否输出分年度指标 NRxxxx / ERxxxx
+        return: (带回撤列的 profit, metrics)
+        """
+        profit = profit.reset_index(drop=True).copy()
+
         # 6. 回撤计算 (基于净收益)
         profit['cum_net_val'] = (1 + profit['origin_profit']).cumprod()
         profit['cummax_net'] = profit['cum_net_val'].cummax()
@@ -230,6 +247,9 @@ class PerformanceAnalyzer:
             'WinRate': win_rate
         }
         
+        if not annual:
+            return profit, metrics
+
         # --- C. 分年度统计 ---
         profit['Year'] = profit['TradingDay'].dt.year
         
@@ -243,16 +263,36 @@ class PerformanceAnalyzer:
         for y, r in annual_excess.items():
             metrics[f'ER{y}'] = r
 
+        return profit, metrics
+
+    @staticmethod
+    def analyze(data, sign=None, profit=None, cfg=None, writer=None):
+        """
+        计算回测指标并生成图表 (sign 为空时使用 cfg.SIGN)
+        profit: 已计算好的 daily_profit 结果，传入时不再重复计算
+        writer: holdings_io.BackgroundWriter，传入时收益明细在后台线程写入
+        """
+        print(">>> [Analysis] 开始计算绩效指标...")
+        cfg = cfg or Config()
+        sign = sign or cfg.SIGN
+        if profit is None:
+            profit = PerformanceAnalyzer.daily_profit(data, cfg)
+        profit, metrics = PerformanceAnalyzer.summarize(profit)
+
         # ==========================================
         # 8. 保存结果
         # ==========================================
-        filename_detail = f"Profit_Detail_{Config.STOCK_POOL}_{Config.SIGN}.csv"
-        path_detail = Config.DIR_REPORTS / filename_detail
-        profit.to_csv(str(path_detail), index=False, encoding='utf_8_sig')
+        if cfg.OUTPUT_FORMAT == 'parquet':
+            path_detail = cfg.DIR_REPORTS / f"Profit_Detail_{cfg.STOCK_POOL}_{sign}.parquet"
+            HoldingsStore.save_profit(profit, path_detail, writer)
+        else:
+            filename_detail = f"Profit_Detail_{cfg.STOCK_POOL}_{sign}.csv"
+            path_detail = cfg.DIR_REPORTS / filename_detail
+            profit.to_csv(str(path_detail), index=False, encoding='utf_8_sig')
 
-        filename_chart = f"Chart_{Config.STOCK_POOL}_{Config.SIGN}.pdf"
-        path_chart = Config.DIR_REPORTS / filename_chart
+        filename_chart = f"Chart_{cfg.STOCK_POOL}_{sign}.pdf"
+        path_chart = cfg.DIR_REPORTS / filename_chart
         
-        PerformanceAnalyzer.plot_performance(profit, metrics, path_chart)
+        PerformanceAnalyzer.plot_performance(profit, metrics, path_chart, sign, cfg)
 
         return metrics
\ No newline at end of file
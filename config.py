@@ -1,7 +1,14 @@
 import os
+import copy
 from pathlib import Path
 
 class Config:
+    """
+    回测配置
+    类属性为默认值；每次运行使用独立实例，通过关键字参数覆盖，不修改类属性:
+        cfg = Config(START_DATE='20230101', STOCK_POOL='800')
+        cfg2 = cfg.replace(SIGN='v2')
+    """
     # ==========================
     # 1. 运行参数设置
     # ==========================
@@ -22,6 +29,60 @@ class Config:
     FEE_RATE     = 0.001
     INDUSTRY_TOL = 0.1
 
+    # 组合构建方式
+    # SELECT_MODE: 'threshold' (factor_score >= SCORE_THRESHOLD) | 'top_n' (得分前 TOP_N 只) | 'top_pct' (得分前 TOP_PCT 比例)
+    # WEIGHT_MODE: 'equal' (等权) | 'score' (按得分加权) | 'rank' (按排名线性加权)
+    SELECT_MODE     = 'threshold'
+    WEIGHT_MODE     = 'equal'
+    SCORE_THRESHOLD = 1
+    TOP_N           = 100
+    TOP_PCT         = 0.1
+    MAX_WEIGHT      = None   # 单票权重上限，如 0.02；None 表示不限制 (对最终持仓中的可交易股票生效，超出部分留作现金)
+
+    # 调仓设置
+    REBALANCE_FREQ   = 'D'    # 'D' 每日 | 'W' 每周首个交易日 | 'M' 每月首个交易日
+    REBALANCE_BUFFER = 0.0    # 不交易缓冲带: 已持有且目标非 0 的股票 |目标权重 - 当前权重| < BUFFER 时保持当前权重
+    REBALANCE_SPEED  = 1.0    # 每次调仓向目标权重移动的比例 (1.0 为一步到位)
+    REBALANCE_TAIL_RATIO = 0.25  # 渐进调仓后目标为 0 且低于 该比例 * (1 / 当日目标持仓数) 的残余仓位直接清仓
+
+    # Walk-forward 滚动评估 (单位: 交易日)
+    WF_TRAIN_DAYS = 484   # 样本内窗口
+    WF_TEST_DAYS  = 121   # 样本外窗口
+    WF_STEP_DAYS  = 121   # 滚动步长
+
+    # 并行进程数 (<= 1 时串行)
+    N_WORKERS = 4
+
+    # 显著性检验 (块 bootstrap + 随机组合零分布)
+    SIG_RESAMPLES  = 0      # 重抽样次数，如 2000；0 表示不运行
+    SIG_BLOCK_SIZE = 20     # bootstrap 块长度 (交易日)
+    SIG_CONF_LEVEL = 0.95
+    SIG_SEED       = 42
+
+    # 收益归因 (行业 Brinson + 因子截面回归)
+    RUN_ATTRIBUTION     = False
+    ATTRIBUTION_FACTORS = []   # 参与因子归因的原始因子列，如 ['Alpha95', 'mmt_normal_M']
+
+    # 风险模型 (风格因子协方差 + 特异风险)
+    RUN_RISK_REPORT = False
+    RISK_FACTORS    = []   # 风格因子列，如 ['liq_turn_std_6M', 'mmt_normal_M']
+    RISK_HALFLIFE   = 60   # 协方差与特异风险 EWMA 半衰期 (交易日)
+    RISK_WARMUP_DAYS = 20  # 风险报告预热期 (交易日)，期间协方差历史不足，不输出 (至少 1 天)
+    # 调仓日目标权重的主动暴露上限 (截面标准化单位)，如 {'liq_turn_std_6M': 0.3}
+    # 停牌继承与非调仓日沿用后实际暴露可能超限，组合构建后打印实际超限天数
+    EXPOSURE_LIMITS = {}
+
+    # 输入数据校验: 重复键、交易日缺口、缺失率、收益异常值 (按文件指纹缓存，文件不变时不重复扫描)
+    # 输入均校验为键唯一时，组合构建跳过防御性去重
+    VALIDATE_INPUTS       = True
+    VALIDATE_MAX_NAN_RATE = 0.5   # 数值列缺失率超过该值时告警
+    VALIDATE_RET_LIMIT    = 0.5   # |日收益| 超过该值计为异常值
+
+    # 持仓与收益明细的输出格式
+    # 'parquet': 只保存非零权重持仓 (字典编码、zstd 压缩)，后台线程写入，用 holdings_io.HoldingsStore 读取
+    # 'csv': 保存完整的组合构建中间表 (旧格式)
+    OUTPUT_FORMAT = 'parquet'
+
     # ==========================
     # 2. 路径配置
     # ==========================
@@ -46,8 +107,55 @@ class Config:
         'all':  ['All']
     }
 
+    # 随上级目录联动的派生路径 (按依赖顺序): {派生项: (上级目录项, 相对路径)}
+    DERIVED_PATHS = {
+        'DATA_DIR':          ('BASE_DIR', 'data'),
+        'RESULTS_DIR':       ('BASE_DIR', 'results'),
+        'STOCK_STATUS_FILE': ('DATA_DIR', 'BetaPool_TradeStatus_ind_index1800_shifted_index_forward.parquet'),
+        'RETURNS_FILE':      ('DATA_DIR', 'ret_df.parquet'),
+        'DIR_CACHE':         ('RESULTS_DIR', 'cache'),
+        'DIR_PORTFOLIO':     ('RESULTS_DIR', 'portfolio'),
+        'DIR_REPORTS':       ('RESULTS_DIR', 'reports'),
+    }
+
+    def __init__(self, **overrides):
+        unknown = [k for k in overrides if k not in self.option_names()]
+        if unknown:
+            raise ValueError(f"未知的配置项: {unknown}")
+        self._overrides = dict(overrides)
+
+        # 可变默认值 (列表/字典) 复制到实例，避免不同运行之间互相影响
+        for name in self.option_names():
+            value = getattr(type(self), name)
+            if isinstance(value, (list, dict)):
+                setattr(self, name, copy.deepcopy(value))
+
+        for name, value in overrides.items():
+            if name in self.DERIVED_PATHS or name == 'BASE_DIR':
+                value = Path(value)
+            setattr(self, name, value)
+
+        # 上级目录被覆盖时，未显式指定的派生路径随之更新
+        changed = set(overrides)
+        for name, (parent, rel) in self.DERIVED_PATHS.items():
+            if name not in overrides and parent in changed:
+                setattr(self, name, getattr(self, parent) / rel)
+                changed.add(name)
+
     @classmethod
-    def initialize_directories(cls):
-        for path in [cls.DIR_CACHE, cls.DIR_PORTFOLIO, cls.DIR_REPORTS]:
+    def option_names(cls):
+        """全部配置项名称 (大写的非方法类属性)"""
+        return [k for k in dir(cls) if k.isupper() and k != 'DERIVED_PATHS' and not callable(getattr(cls, k))]
+
+    def options(self):
+        """当前实例的全部配置项"""
+        return {k: getattr(self, k) for k in self.option_names()}
+
+    def replace(self, **overrides):
+        """在当前覆盖项基础上生成新的配置实例"""
+        return type(self)(**{**self._overrides, **overrides})
+
+    def initialize_directories(self):
+        for path in [self.DIR_CACHE, self.DIR_PORTFOLIO, self.DIR_REPORTS]:
             path.mkdir(parents=True, exist_ok=True)
-        print(f"工作目录已初始化: {cls.RESULTS_DIR}")
\ No newline at end of file
+        print(f"工作目录已初始化: {self.RESULTS_DIR}")
\ No newline at end of file
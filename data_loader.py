@@ -1,15 +1,19 @@
 import pandas as pd
+import pyarrow.parquet as pq
 import os
 from config import Config
+from utils import format_secucode
+from data_validator import DataValidator
 
 class StockPoolSelector:
     @staticmethod
-    def filter(df):
-        pool_name = str(Config.STOCK_POOL)
+    def filter(df, cfg=None):
+        cfg = cfg or Config()
+        pool_name = str(cfg.STOCK_POOL)
         input_lower = pool_name.lower()
         if input_lower == 'all':
             return df
-        mapping = Config.POOL_MAPPING
+        mapping = cfg.POOL_MAPPING
         if pool_name in mapping:
             cols = mapping[pool_name]
             mask = pd.Series(False, index=df.index)
@@ -27,40 +31,91 @@ class StockPoolSelector:
         raise ValueError(f"未知的股票池标识: {pool_name}")
 
 class DataLoader:
-    def __init__(self):
-        self.start_dt = pd.to_datetime(Config.START_DATE)
-        self.end_dt = pd.to_datetime(Config.END_DATE)
+    def __init__(self, cfg=None):
+        self.cfg = cfg or Config()
+        self.start_dt = pd.to_datetime(self.cfg.START_DATE)
+        self.end_dt = pd.to_datetime(self.cfg.END_DATE)
+        # 输入校验 (VALIDATE_INPUTS 关闭时为 None) 与状态文件的完整交易日历
+        self.validator = DataValidator(self.cfg) if self.cfg.VALIDATE_INPUTS else None
+        self.calendar = None
+
+    def _validate(self, path, df, calendar=None):
+        """校验输入文件 (按文件指纹缓存)，未开启校验时返回 None"""
+        if self.validator is None:
+            return None
+        return self.validator.check(path, df, calendar)
+
+    def _year_calendar(self, year):
+        if self.calendar is None:
+            return None
+        return self.calendar[self.calendar.year == int(year)]
+
+    def _factor_paths(self, year):
+        """某年的基础因子文件与额外因子文件路径"""
+        names = ['Factors_ALL_all'] + [f for f in self.cfg.ADDITIONAL_FACTORS if f != 'Factors_ALL_all']
+        return [self.cfg.DATA_DIR / str(year) / f"{name}.parquet" for name in names]
+
+    def validate_year_files(self, year):
+        """校验某年的全部因子文件 (用于得分命中缓存、未读取因子的年份)，已有指纹缓存时不读取文件"""
+        if self.validator is None:
+            return
+        for path in self._factor_paths(year):
+            if path.exists():
+                self._validate(path, lambda: self._read_factor_file(path), self._year_calendar(year))
+
+    def inputs_clean(self):
+        """
+        本次读取的输入文件均已校验，且据此合并出的面板 (TradingDay, SecuCode) 唯一
+        额外因子文件在合并前会按校验结果去重，因此只要求其没有日历外交易日
+        """
+        if self.validator is None or not self.validator.reports:
+            return False
+        additional = set(self.cfg.ADDITIONAL_FACTORS) - {'Factors_ALL_all'}
+        return all(
+            report['clean'] or (path.stem in additional and not report.get('extra_days'))
+            for path, report in self.validator.reports.items()
+        )
+
+    @staticmethod
+    def _read_factor_file(path):
+        df = pd.read_parquet(str(path))
+        df['TradingDay'] = pd.to_datetime(df['TradingDay'])
+        return df
 
     def load_stock_status(self):
-        print(f"读取状态文件: {Config.STOCK_STATUS_FILE}")
-        if not Config.STOCK_STATUS_FILE.exists():
-            raise FileNotFoundError(f"找不到状态文件: {Config.STOCK_STATUS_FILE}")
-        df = pd.read_parquet(str(Config.STOCK_STATUS_FILE))
+        print(f"读取状态文件: {self.cfg.STOCK_STATUS_FILE}")
+        if not self.cfg.STOCK_STATUS_FILE.exists():
+            raise FileNotFoundError(f"找不到状态文件: {self.cfg.STOCK_STATUS_FILE}")
+        df = pd.read_parquet(str(self.cfg.STOCK_STATUS_FILE))
         df['TradingDay'] = pd.to_datetime(df['TradingDay'])
+        # 状态文件的交易日作为其余输入的交易日历
+        self.calendar = pd.DatetimeIndex(df['TradingDay'].unique()).sort_values()
+        self._validate(self.cfg.STOCK_STATUS_FILE, df)
         df = df[(df['TradingDay'] >= self.start_dt) & (df['TradingDay'] <= self.end_dt)]
-        df = StockPoolSelector.filter(df)
+        df = StockPoolSelector.filter(df, self.cfg)
         df['Year'] = df['TradingDay'].dt.year.astype(str)
         return df
 
     def load_returns(self):
-        print(f"读取收益文件: {Config.RETURNS_FILE}")
-        if not Config.RETURNS_FILE.exists():
-             raise FileNotFoundError(f"找不到收益文件: {Config.RETURNS_FILE}")
-        df = pd.read_parquet(str(Config.RETURNS_FILE))
+        print(f"读取收益文件: {self.cfg.RETURNS_FILE}")
+        if not self.cfg.RETURNS_FILE.exists():
+             raise FileNotFoundError(f"找不到收益文件: {self.cfg.RETURNS_FILE}")
+        df = pd.read_parquet(str(self.cfg.RETURNS_FILE))
         df['TradingDay'] = pd.to_datetime(df['TradingDay'])
+        self._validate(self.cfg.RETURNS_FILE, df, self.calendar)
         ret_map = {'open5twap': 'ret_open5twap', 'c2c': 'ret_c2c'}
-        col = ret_map.get(Config.RET_IDX)
+        col = ret_map.get(self.cfg.RET_IDX)
         if not col or col not in df.columns:
             raise ValueError(f"收益列 {col} 无效或缺失")
         return df[['TradingDay', 'SecuCode', col]]
 
     def load_year_factors(self, year):
-        file_path = Config.DATA_DIR / str(year) / "Factors_ALL_all.parquet"
+        file_path = self.cfg.DATA_DIR / str(year) / "Factors_ALL_all.parquet"
         if not file_path.exists():
             print(f"警告: 年份 {year} 的基础因子文件不存在")
             return None
-        df = pd.read_parquet(str(file_path))
-        df['TradingDay'] = pd.to_datetime(df['TradingDay'])
+        df = DataLoader._read_factor_file(file_path)
+        self._validate(file_path, df, self._year_calendar(year))
         return df
 
     # ===============================================
@@ -68,14 +123,14 @@ class DataLoader:
     # ===============================================
     def merge_additional_factors(self, combined_df, year):
         """
-        读取 Config.ADDITIONAL_FACTORS 中的文件并合并
+        读取 cfg.ADDITIONAL_FACTORS 中的文件并合并
         """
-        if not Config.ADDITIONAL_FACTORS:
+        if not self.cfg.ADDITIONAL_FACTORS:
             return combined_df
 
-        year_dir = Config.DATA_DIR / str(year)
+        year_dir = self.cfg.DATA_DIR / str(year)
         
-        for factor_name in Config.ADDITIONAL_FACTORS:
+        for factor_name in self.cfg.ADDITIONAL_FACTORS:
             # 跳过基础文件，防止重复
             if factor_name == 'Factors_ALL_all':
                 continue
@@ -92,11 +147,13 @@ class DataLoader:
                 if 'TradingDay' in add_df.columns:
                     add_df['TradingDay'] = pd.to_datetime(add_df['TradingDay'])
 
-             
-                if add_df.duplicated(subset=['TradingDay', 'SecuCode']).any():
-                    dup_count = add_df.duplicated(subset=['TradingDay', 'SecuCode']).sum()
-                    print(f"     [警告] 发现 {dup_count} 条重复数据，正在去重...")
-                    add_df = add_df.drop_duplicates(subset=['TradingDay', 'SecuCode'], keep='first')
+                # 校验确认键唯一时跳过去重扫描；否则只扫描一次
+                report = self._validate(file_path, add_df, self._year_calendar(year))
+                if report is None or report['duplicate_keys']:
+                    dup_mask = add_df.duplicated(subset=['TradingDay', 'SecuCode'])
+                    if dup_mask.any():
+                        print(f"     [警告] 发现 {int(dup_mask.sum())} 条重复数据，正在去重...")
+                        add_df = add_df[~dup_mask]
                 
                 # 左连接合并
                 combined_df = pd.merge(combined_df, add_df, on=['TradingDay', 'SecuCode'], how='left')
@@ -105,5 +162,42 @@ class DataLoader:
                 print(f"错误: 合并因子文件 {factor_name} 失败: {e}")
                 
         return combined_df
-                
-    
\ No newline at end of file
+
+    def load_factor_columns(self, columns):
+        """
+        读取指定的因子列 (基础因子文件 + ADDITIONAL_FACTORS)，供归因分析等后续模块使用
+        只读取需要的列；SecuCode 统一格式化，便于与组合结果合并
+        """
+        if not columns:
+            return pd.DataFrame(columns=['TradingDay', 'SecuCode'])
+        frames = []
+        for year in range(self.start_dt.year, self.end_dt.year + 1):
+            year_df = None
+            remaining = list(columns)
+            for file_path in self._factor_paths(year):
+                if not remaining or not file_path.exists():
+                    continue
+                names = pq.read_schema(str(file_path)).names
+                wanted = [c for c in remaining if c in names]
+                if not wanted:
+                    continue
+                df = pd.read_parquet(str(file_path), columns=['TradingDay', 'SecuCode'] + wanted)
+                df['TradingDay'] = pd.to_datetime(df['TradingDay'])
+                if not (self.validator and self.validator.is_clean(file_path)):
+                    df = df.drop_duplicates(subset=['TradingDay', 'SecuCode'], keep='first')
+                year_df = df if year_df is None else pd.merge(year_df, df, on=['TradingDay', 'SecuCode'], how='outer')
+                remaining = [c for c in remaining if c not in wanted]
+            if year_df is not None:
+                frames.append(year_df)
+        if not frames:
+            print(f"警告: 未找到因子列 {columns}")
+            return pd.DataFrame(columns=['TradingDay', 'SecuCode'])
+
+        df = pd.concat(frames, ignore_index=True)
+        df = df[(df['TradingDay'] >= self.start_dt) & (df['TradingDay'] <= self.end_dt)].copy()
+        codes = df['SecuCode'].unique()
+        df['SecuCode'] = df['SecuCode'].map(dict(zip(codes, [format_secucode(c) for c in codes])))
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            print(f"警告: 以下因子列不存在: {missing}")
+        return df.reset_index(drop=True)
@@ -0,0 +1,160 @@
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from config import Config
+from utils import atomic_write
+
+KEY_COLS = ['TradingDay', 'SecuCode']
+
+class DataValidator:
+    """
+    输入数据完整性检查
+    每个输入文件只检查一次: 结果按文件指纹 (路径 + 大小 + 修改时间) 与检查参数缓存到 DIR_CACHE/validation，
+    文件未变化时直接读取缓存结果，不再扫描数据
+    检查项 (一次向量化扫描):
+      - 重复键: (TradingDay, SecuCode) 重复的行数
+      - 交易日缺口: 相对状态文件交易日历缺失 / 多出的交易日
+      - 缺失率: 每个数值列的 NaN 比例与 inf 数量
+      - 收益异常值: |收益| 超过 VALIDATE_RET_LIMIT 的记录数
+    """
+    RET_COLS = ['ret_open5twap', 'ret_c2c']
+    MAX_LISTED_DAYS = 10   # 报告中最多列出的缺失/多出交易日
+
+    def __init__(self, cfg=None):
+        self.cfg = cfg or Config()
+        self.cache_dir = self.cfg.DIR_CACHE / 'validation'
+        # 本次运行已检查的文件 {Path: 检查结果}
+        self.reports = {}
+
+    @staticmethod
+    def fingerprint(path):
+        stat = path.stat()
+        raw = f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()[:12]
+
+    def _cache_key(self, path, calendar):
+        parts = [DataValidator.fingerprint(path), str(self.cfg.VALIDATE_MAX_NAN_RATE), str(self.cfg.VALIDATE_RET_LIMIT)]
+        if calendar is not None:
+            parts.append(hashlib.md5(np.asarray(calendar, dtype='datetime64[D]').tobytes()).hexdigest())
+        return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+    def check(self, path, df, calendar=None):
+        """
+        检查来自 path 的数据，命中指纹缓存时直接返回缓存结果
+        df: 已读取的 DataFrame (TradingDay 已转为日期)，或返回它的函数 (仅在未命中缓存时调用)
+        calendar: 应覆盖的交易日，为空时不检查交易日缺口
+        """
+        path = Path(path)
+        if path in self.reports:
+            return self.reports[path]
+
+        key = self._cache_key(path, calendar)
+        cache_file = self.cache_dir / f"{path.parent.name}_{path.stem}_{key}.json"
+        if cache_file.exists():
+            report = json.loads(cache_file.read_text(encoding='utf-8'))
+            cached = True
+        else:
+            report = self.inspect(df() if callable(df) else df, calendar)
+            report.update(file=str(path), fingerprint=key)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            text = json.dumps(report, ensure_ascii=False, indent=1)
+            atomic_write(cache_file, lambda tmp: tmp.write_text(text, encoding='utf-8'))
+            cached = False
+
+        self.reports[path] = report
+        DataValidator._print(report, cached)
+        return report
+
+    def inspect(self, df, calendar=None):
+        """对单个 DataFrame 做全部检查，返回结构化结果 (可 JSON 序列化)"""
+        report = {'rows': int(len(df))}
+
+        # 1. 重复键: 交易日与代码分别编码后合成整数键，一次哈希计数
+        day_codes, days = pd.factorize(df['TradingDay'], sort=True)
+        secu_codes, secus = pd.factorize(df['SecuCode'])
+        key = day_codes.astype(np.int64) * max(len(secus), 1) + secu_codes
+        report['duplicate_keys'] = int(len(key) - len(pd.unique(key)))
+
+        # 2. 交易日缺口
+        days = pd.DatetimeIndex(days)
+        report['first_day'] = days[0].strftime('%Y-%m-%d') if len(days) else None
+        report['last_day'] = days[-1].strftime('%Y-%m-%d') if len(days) else None
+        if calendar is not None:
+            calendar = pd.DatetimeIndex(calendar)
+            missing = calendar.difference(days)
+            extra = days.difference(calendar)
+            report['missing_days'] = int(len(missing))
+            report['missing_day_list'] = missing[:DataValidator.MAX_LISTED_DAYS].strftime('%Y-%m-%d').tolist()
+            report['extra_days'] = int(len(extra))
+            report['extra_day_list'] = extra[:DataValidator.MAX_LISTED_DAYS].strftime('%Y-%m-%d').tolist()
+
+        # 3. 数值列缺失率与 inf
+        nan_rate, inf_count = {}, {}
+        for col in df.columns:
+            if col in KEY_COLS or not pd.api.types.is_numeric_dtype(df[col]):
+                continue
+            values = df[col].to_numpy(dtype=float, na_value=np.nan)
+            nan_rate[col] = float(np.isnan(values).mean()) if len(values) else 0.0
+            n_inf = int(np.isinf(values).sum())
+            if n_inf:
+                inf_count[col] = n_inf
+        report['nan_rate'] = nan_rate
+        report['high_nan_columns'] = [c for c, r in nan_rate.items() if r > self.cfg.VALIDATE_MAX_NAN_RATE]
+        report['inf_count'] = inf_count
+
+        # 4. 收益异常值
+        limit = self.cfg.VALIDATE_RET_LIMIT
+        report['ret_outliers'] = {
+            col: int((np.abs(df[col].to_numpy(dtype=float, na_value=np.nan)) > limit).sum())
+            for col in DataValidator.RET_COLS if col in df.columns
+        }
+
+        # 键唯一且没有日历外交易日 (跨年份文件拼接后可能重复) 即视为干净，后续环节可以跳过防御性去重；其余项只告警
+        report['clean'] = report['duplicate_keys'] == 0 and not report.get('extra_days')
+        return report
+
+    @staticmethod
+    def _print(report, cached):
+        issues = []
+        if report['duplicate_keys']:
+            issues.append(f"重复键 {report['duplicate_keys']} 行")
+        if report.get('missing_days'):
+            issues.append(f"缺失交易日 {report['missing_days']} 天 (如 {report['missing_day_list'][:3]})")
+        if report.get('extra_days'):
+            issues.append(f"日历外交易日 {report['extra_days']} 天 (如 {report['extra_day_list'][:3]})")
+        if report['high_nan_columns']:
+            cols = report['high_nan_columns']
+            issues.append(f"缺失率过高的列 {len(cols)} 个 (如 {cols[:5]})")
+        if report['inf_count']:
+            issues.append(f"含 inf 的列: {list(report['inf_count'])[:5]}")
+        if any(report['ret_outliers'].values()):
+            issues.append(f"收益异常值: {report['ret_outliers']}")
+        tag = " (缓存)" if cached else ""
+        print(f"   [校验{tag}] {Path(report['file']).name}: {'; '.join(issues) if issues else '通过'}")
+
+    def is_clean(self, path):
+        """path 已在本次运行中检查且结果为干净"""
+        report = self.reports.get(Path(path))
+        return bool(report and report['clean'])
+
+    def summary(self):
+        """每个已检查文件一行的诊断汇总表"""
+        rows = []
+        for path, r in self.reports.items():
+            rows.append({
+                'File': str(path),
+                'Rows': r['rows'],
+                'FirstDay': r['first_day'],
+                'LastDay': r['last_day'],
+                'DuplicateKeys': r['duplicate_keys'],
+                'MissingDays': r.get('missing_days'),
+                'ExtraDays': r.get('extra_days'),
+                'MaxNanRate': max(r['nan_rate'].values(), default=0.0),
+                'HighNanColumns': ','.join(r['high_nan_columns']),
+                'InfColumns': ','.join(r['inf_count']),
+                'RetOutliers': sum(r['ret_outliers'].values()),
+                'Clean': r['clean'],
+            })
+        return pd.DataFrame(rows)
@@ -1,23 +1,53 @@
 import pandas as pd
 import numpy as np
 from config import Config
-from utils import format_secucode, mquantiles
+from utils import format_secucode, quantile_sorted
+
+class SortedFactorCache:
+    """
+    当日截面因子缓存
+    同一交易日内每个因子列只取值、排序一次，批量回测时由多个打分函数共享
+    """
+    def __init__(self, df):
+        self.df = df
+        self._values = {}
+        self._sorted = {}
+
+    def get(self, col_name):
+        """安全获取因子数据，防止列不存在报错"""
+        if col_name not in self._values:
+            if col_name in self.df.columns:
+                self._values[col_name] = self.df[col_name].values
+            else:
+                # 如果缺少因子，返回全NaN或0，视策略容忍度而定
+                self._values[col_name] = np.full(len(self.df), np.nan)
+        return self._values[col_name]
+
+    def quantile(self, col_name, q):
+        """等价于 mquantiles(get(col_name), q)，排序结果在当日内复用"""
+        if col_name not in self._sorted:
+            vals = self.get(col_name)
+            self._sorted[col_name] = np.sort(vals[~np.isnan(vals)])
+        return quantile_sorted(self._sorted[col_name], q)
 
 class FactorEngine:
+    # 保留在打分结果中的元数据列
+    META_COLS = ['Industry', 'TradeStatus', 'SwingStatus',
+                 'StopTradeStatus3', 'StopTradeStatus5', 'IpoStatus']
+
     @staticmethod
-    def calculate_score(df):
+    def calculate_score(df, factors=None):
         """
         核心打分逻辑
         df: 当日截面数据
+        factors: 当日 SortedFactorCache (批量回测时共享)，为空时自动创建
         return: Series (index=df.index, value=score)
         """
-        # 1. 安全获取因子数据，防止列不存在报错
-        def get_vals(col_name):
-            if col_name in df.columns:
-                return df[col_name].values
-            else:
-                # 如果缺少因子，返回全NaN或0，视策略容忍度而定
-                return np.full(len(df), np.nan)
+        # 1. 安全获取因子数据 / 分位数，防止列不存在报错
+        if factors is None:
+            factors = SortedFactorCache(df)
+        get_vals = factors.get
+        quantile = factors.quantile
 
         # 提取因子变量 (根据你的策略需要添加)
         Alpha95 = get_vals('Alpha95')
@@ -39,12 +69,12 @@ class FactorEngine:
         
         # 示例逻辑：
         stock_pool = (
-            (1 * (Alpha95 <= mquantiles(Alpha95, 0.6))) 
-            + (1 * (Alpha100 <= mquantiles(Alpha100, 0.7)))
-            - (1 * (corr_price_turn_1M >= mquantiles(corr_price_turn_1M, 0.8)))
-            - (1 * (corr_rety_turn_6M >= mquantiles(corr_rety_turn_6M, 0.8)))
-            - (1 * (corr_rety_turn_post_6M >= mquantiles(corr_rety_turn_post_6M, 0.8)))
-            - (1 * (mmt_normal_M >= mquantiles(mmt_normal_M, 0.9)))
+            (1 * (Alpha95 <= quantile('Alpha95', 0.6))) 
+            + (1 * (Alpha100 <= quantile('Alpha100', 0.7)))
+            - (1 * (corr_price_turn_1M >= quantile('corr_price_turn_1M', 0.8)))
+            - (1 * (corr_rety_turn_6M >= quantile('corr_rety_turn_6M', 0.8)))
+            - (1 * (corr_rety_turn_post_6M >= quantile('corr_rety_turn_post_6M', 0.8)))
+            - (1 * (mmt_normal_M >= quantile('mmt_normal_M', 0.9)))
         ) / 2
 
       
@@ -59,32 +89,41 @@ class FactorEngine:
     @staticmethod
     def run_scoring_for_year(year_df, year):
         """处理单年数据并计算得分"""
-        print(f"正在计算 {year} 年因子得分...")
-        results = []
-        
+        return FactorEngine.run_batch_scoring_for_year(
+            year_df, year, {None: FactorEngine.calculate_score}
+        )[None]
+
+    @staticmethod
+    def run_batch_scoring_for_year(year_df, year, strategies):
+        """
+        批量计算单年得分
+        strategies: {SIGN: score_func}，score_func 签名同 calculate_score
+        return: {SIGN: DataFrame}，各策略共享同一次按天分组与因子排序
+        """
+        print(f"正在计算 {year} 年因子得分 (策略数: {len(strategies)})...")
+        if year_df.empty:
+            return {sign: pd.DataFrame() for sign in strategies}
+
+        # 按天稳定排序，使每日截面在数组中连续，得分可按位置直接写回
+        year_df = year_df.sort_values('TradingDay', kind='mergesort').reset_index(drop=True)
+        scores = {sign: np.full(len(year_df), np.nan) for sign in strategies}
+
         # 按天分组
-        for day, group in year_df.groupby('TradingDay'):
-            score = FactorEngine.calculate_score(group)
-            
-            res = pd.DataFrame({
-                'TradingDay': day,
-                'SecuCode': group['SecuCode'],
-                'factor_score': score.values
-            })
-            
-            # 保留必要的元数据列
-            meta_cols = ['Industry', 'TradeStatus', 'SwingStatus', 
-                         'StopTradeStatus3', 'StopTradeStatus5', 'IpoStatus']
-            for col in meta_cols:
-                if col in group.columns:
-                    res[col] = group[col].values
-            
-            results.append(res)
-            
-        if not results:
-            return pd.DataFrame()
-        
-        full_df = pd.concat(results, ignore_index=True)
+        for day, idx in year_df.groupby('TradingDay').indices.items():
+            group = year_df.iloc[idx]
+            factors = SortedFactorCache(group)
+            for sign, score_func in strategies.items():
+                scores[sign][idx] = np.asarray(score_func(group, factors), dtype=float)
+
+        # 保留必要的元数据列
+        keep_cols = ['TradingDay', 'SecuCode'] + [c for c in FactorEngine.META_COLS if c in year_df.columns]
+        base = year_df[keep_cols].copy()
         # 格式化股票代码
-        full_df['SecuCode'] = full_df['SecuCode'].apply(format_secucode)
-        return full_df
\ No newline at end of file
+        base['SecuCode'] = base['SecuCode'].apply(format_secucode)
+
+        results = {}
+        for sign in strategies:
+            res = base.copy()
+            res.insert(2, 'factor_score', scores[sign])
+            results[sign] = res
+        return results
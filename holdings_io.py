@@ -0,0 +1,121 @@
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+
+class BackgroundWriter:
+    """
+    后台单线程写文件: 回测主流程只负责准备数据，压缩与磁盘 IO 在后台线程完成
+    pyarrow 写 Parquet 时会释放 GIL，可与后续的绩效分析并行
+    """
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+
+    def submit(self, func, *args, **kwargs):
+        future = self._pool.submit(func, *args, **kwargs)
+        self._futures.append(future)
+        return future
+
+    def wait(self):
+        """等待已提交的写入全部完成，写入中的异常在此抛出"""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.wait()
+        self._pool.shutdown()
+
+class HoldingsStore:
+    """
+    每日持仓 / 收益明细的紧凑存储
+      - 持仓只保留权重非零的记录 (稀疏)，SecuCode / Industry 字典编码，数值列保持原类型
+      - 全部交易日写入文件元数据，空仓日在还原权重面板时不会丢失
+    """
+    HOLDING_COLS = ['TradingDay', 'SecuCode', 'Industry', 'factor_score', 'weight']
+    DICT_COLS = ['SecuCode', 'Industry']
+    COMPRESSION = 'zstd'
+
+    @staticmethod
+    def _write(table, path):
+        pq.write_table(table, str(path), compression=HoldingsStore.COMPRESSION)
+
+    @staticmethod
+    def holdings_table(df):
+        """由 construct 的结果生成稀疏持仓表 (在主线程调用，返回的 Table 与 df 不再共享可变数据)"""
+        cols = [c for c in HoldingsStore.HOLDING_COLS if c in df.columns]
+        held = df.loc[df['weight'].fillna(0) != 0, cols]
+        held = held.assign(**{c: held[c].astype('category') for c in HoldingsStore.DICT_COLS if c in cols})
+        table = pa.Table.from_pandas(held, preserve_index=False)
+
+        days = pd.DatetimeIndex(np.sort(df['TradingDay'].unique()))
+        meta = dict(table.schema.metadata or {})
+        meta[b'trading_days'] = json.dumps(days.strftime('%Y-%m-%d').tolist()).encode()
+        return table.replace_schema_metadata(meta)
+
+    @staticmethod
+    def save_holdings(df, path, writer=None):
+        table = HoldingsStore.holdings_table(df)
+        if writer is None:
+            HoldingsStore._write(table, path)
+        else:
+            writer.submit(HoldingsStore._write, table, path)
+        return path
+
+    @staticmethod
+    def save_profit(profit, path, writer=None):
+        table = pa.Table.from_pandas(profit, preserve_index=False)
+        if writer is None:
+            HoldingsStore._write(table, path)
+        else:
+            writer.submit(HoldingsStore._write, table, path)
+        return path
+
+    @staticmethod
+    def load_holdings(path, start=None, end=None):
+        """读取稀疏持仓长表 (SecuCode / Industry 为 category 类型)"""
+        filters = []
+        if start is not None:
+            filters.append(('TradingDay', '>=', pd.Timestamp(start)))
+        if end is not None:
+            filters.append(('TradingDay', '<=', pd.Timestamp(end)))
+        table = pq.read_table(str(path), filters=filters or None, read_dictionary=HoldingsStore.DICT_COLS)
+        return table.to_pandas()
+
+    @staticmethod
+    def trading_days(path):
+        """文件中记录的全部交易日 (含空仓日)"""
+        meta = pq.read_schema(str(path)).metadata or {}
+        if b'trading_days' not in meta:
+            return None
+        return pd.DatetimeIndex(json.loads(meta[b'trading_days']), name='TradingDay')
+
+    @staticmethod
+    def load_weight_panel(path, start=None, end=None):
+        """
+        还原 (交易日 x SecuCode) 权重面板，未持仓处为 0
+        直接使用字典编码的下标填充二维数组，不经过 pivot
+        """
+        table = pq.read_table(str(path), columns=['TradingDay', 'SecuCode', 'weight'],
+                              read_dictionary=['SecuCode']).unify_dictionaries()
+        codes = table.column('SecuCode').combine_chunks()
+        code_idx = codes.indices.to_numpy(zero_copy_only=False)
+        code_names = codes.dictionary.to_pylist()
+        day_values = table.column('TradingDay').to_numpy()
+        weights = table.column('weight').to_numpy()
+
+        days = HoldingsStore.trading_days(path)
+        if days is None:
+            days = pd.DatetimeIndex(np.unique(day_values), name='TradingDay')
+        day_idx = days.get_indexer(pd.DatetimeIndex(day_values))
+
+        panel = np.zeros((len(days), len(code_names)))
+        panel[day_idx, code_idx] = weights
+        panel = pd.DataFrame(panel, index=days, columns=pd.Index(code_names, name='SecuCode'))
+        panel = panel.sort_index(axis=1)
+        if start is not None or end is not None:
+            panel = panel.loc[start:end]
+        return panel
@@ -1,105 +1,294 @@
 import pandas as pd
 import time
+import ast
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from config import Config
-from utils import get_config_identifier, format_secucode
+from utils import get_config_identifier, format_secucode, atomic_write
 from data_loader import DataLoader
 from factor_engine import FactorEngine
 from portfolio import PortfolioOptimizer
 from analysis import PerformanceAnalyzer
+from significance import SignificanceTester
+from attribution import PerformanceAttribution
+from risk_model import RiskModel
+from holdings_io import BackgroundWriter
 
 class BacktestRunner:
-    def __init__(self):
-        Config.initialize_directories()
-        self.loader = DataLoader()
-        self.identifier = get_config_identifier()
+    def __init__(self, cfg=None):
+        # 每个运行持有独立的配置实例，同一进程内多次/并行运行互不影响
+        self.cfg = cfg or Config()
+        self.cfg.initialize_directories()
+        self.loader = DataLoader(self.cfg)
+        self.identifier = get_config_identifier(cfg=self.cfg)
+        # 批量模式下注册的策略 {SIGN: score_func}
+        self.strategies = {}
+        # 归因等模块所需的原始因子列，按列集合缓存 (批量模式下各策略共享)
+        self._factor_cache = {}
+        # 持仓/收益明细在后台线程写盘，run() 结束前统一等待
+        self.writer = BackgroundWriter()
         print(f"\n{'='*40}")
-        print(f"回测启动: {Config.SIGN}")
+        print(f"回测启动: {self.cfg.SIGN}")
         print(f"配置哈希: {self.identifier}")
-        print(f"强制重跑: {Config.FORCE_RERUN}") # 提示当前状态
-        print(f"股票池: {Config.STOCK_POOL} | 额外因子: {Config.ADDITIONAL_FACTORS}")
+        print(f"强制重跑: {self.cfg.FORCE_RERUN}") # 提示当前状态
+        print(f"股票池: {self.cfg.STOCK_POOL} | 额外因子: {self.cfg.ADDITIONAL_FACTORS}")
         print(f"{'='*40}\n")
 
-    def run(self):
-        t0 = time.time()
-        
+    def register(self, sign, score_func):
+        """
+        注册批量回测策略
+        score_func(df, factors): 签名同 FactorEngine.calculate_score
+        注册后 run() 进入批量模式: 数据只加载、合并一次，各策略分别输出报告并生成对比汇总
+        """
+        if sign in self.strategies:
+            raise ValueError(f"策略 {sign} 已注册")
+        self.strategies[sign] = score_func
+        return self
+
+    def load_scores(self, strategies):
+        """
+        加载数据并计算 (或读取缓存) 各策略得分
+        return: ({SIGN: 全样本得分 DataFrame}, returns_df)，失败时返回 (None, None)
+        """
         try:
             status_df = self.loader.load_stock_status()
             returns_df = self.loader.load_returns()
         except Exception as e:
             print(f"数据加载失败: {e}")
-            return
-        
+            return None, None
+
         if status_df.empty:
             print("错误: 筛选后的股票池为空。")
-            return
-        
+            return None, None
+
         years = sorted(status_df['Year'].unique())
-        all_scores = []
-        
+        all_scores = {sign: [] for sign in strategies}
+
         print(f"即将处理年份: {years}")
-        
+
         for year in years:
-            cache_filename = f"score_{year}_{self.identifier}.csv"
-            cache_path = Config.DIR_CACHE / cache_filename
-            
-            year_score = pd.DataFrame()
-            
-            # [关键修改] 加入 FORCE_RERUN 判断
-            if not Config.FORCE_RERUN and cache_path.exists():
-                print(f"[{year}] 命中缓存: {cache_filename}")
-                year_score = pd.read_csv(str(cache_path))
-                year_score['TradingDay'] = pd.to_datetime(year_score['TradingDay'])
-                year_score['SecuCode'] = year_score['SecuCode'].apply(format_secucode)
-            else:
-                if Config.FORCE_RERUN:
-                    print(f"[{year}] 强制重算 (忽略缓存)...")
-                
-                year_status = status_df[status_df['Year'] == year]
-                factor_df = self.loader.load_year_factors(year)
-                
-                if factor_df is None or factor_df.empty:
-                    print(f"[{year}] 无因子数据，跳过")
-                    continue
-                    
-                print(f"[{year}] 合并基础数据...")
-                combined = pd.merge(year_status, factor_df, on=['TradingDay','SecuCode'], how='left')
-                
-                # 调用额外因子合并
-                combined = self.loader.merge_additional_factors(combined, year)
-                
-                # 计算得分
-                year_score = FactorEngine.run_scoring_for_year(combined, year)
-                
+            # 逐策略检查缓存，仅对未命中的策略合并数据并打分
+            pending = {}
+            cache_paths = {}
+            for sign, score_func in strategies.items():
+                cache_filename = f"score_{year}_{get_config_identifier(sign, self.cfg)}.csv"
+                cache_path = self.cfg.DIR_CACHE / cache_filename
+                cache_paths[sign] = cache_path
+
+                # [关键修改] 加入 FORCE_RERUN 判断
+                if not self.cfg.FORCE_RERUN and cache_path.exists():
+                    print(f"[{year}] 命中缓存: {cache_filename}")
+                    year_score = pd.read_csv(str(cache_path))
+                    year_score['TradingDay'] = pd.to_datetime(year_score['TradingDay'])
+                    year_score['SecuCode'] = year_score['SecuCode'].apply(format_secucode)
+                    if not year_score.empty:
+                        all_scores[sign].append(year_score)
+                else:
+                    pending[sign] = score_func
+
+            if not pending:
+                # 得分全部命中缓存时不读取因子，仍需确认文件已校验 (有指纹缓存时不读取文件)
+                self.loader.validate_year_files(year)
+                continue
+
+            if self.cfg.FORCE_RERUN:
+                print(f"[{year}] 强制重算 (忽略缓存)...")
+
+            year_status = status_df[status_df['Year'] == year]
+            factor_df = self.loader.load_year_factors(year)
+
+            if factor_df is None or factor_df.empty:
+                print(f"[{year}] 无因子数据，跳过")
+                continue
+
+            print(f"[{year}] 合并基础数据...")
+            combined = pd.merge(year_status, factor_df, on=['TradingDay','SecuCode'], how='left')
+
+            # 调用额外因子合并
+            combined = self.loader.merge_additional_factors(combined, year)
+
+            # 计算得分 (所有待算策略共享同一次分组与因子排序)
+            year_scores = FactorEngine.run_batch_scoring_for_year(combined, year, pending)
+
+            for sign, year_score in year_scores.items():
                 # 写入缓存
                 if not year_score.empty:
-                    print(f"[{year}] 写入缓存: {cache_filename}")
-                    year_score.to_csv(str(cache_path), index=False, encoding='utf_8_sig')
-            
-            if not year_score.empty:
-                all_scores.append(year_score)
-            
-        if not all_scores:
-            print("错误: 未能生成有效数据。")
-            return
-            
-        print("\n>>> 合并全样本数据...")
-        full_df = pd.concat(all_scores, ignore_index=True)
-        full_df = pd.merge(full_df, returns_df, on=['TradingDay', 'SecuCode'], how='left')
-        
+                    print(f"[{year}] 写入缓存: {cache_paths[sign].name}")
+                    atomic_write(cache_paths[sign], lambda tmp: year_score.to_csv(str(tmp), index=False, encoding='utf_8_sig'))
+                    all_scores[sign].append(year_score)
+
+        scores = {}
+        for sign, frames in all_scores.items():
+            if not frames:
+                print(f"错误: 策略 {sign} 未能生成有效数据。")
+                continue
+            scores[sign] = pd.concat(frames, ignore_index=True)
+        return scores, returns_df
+
+    def load_factor_columns(self, columns):
+        """读取原始因子列，同一组列只从磁盘加载一次"""
+        key = tuple(columns)
+        if key not in self._factor_cache:
+            self._factor_cache[key] = self.loader.load_factor_columns(list(columns))
+        return self._factor_cache[key]
+
+    def build_portfolio(self, sign, score_df, returns_df):
+        """合并收益 -> 组合构建，返回每日持仓"""
+        full_df = pd.merge(score_df, returns_df, on=['TradingDay', 'SecuCode'], how='left')
+        # 暴露约束需要在组合构建时带上对应的原始因子列
+        if self.cfg.EXPOSURE_LIMITS:
+            factor_df = self.load_factor_columns(list(self.cfg.EXPOSURE_LIMITS))
+            full_df = pd.merge(full_df, factor_df, on=['TradingDay', 'SecuCode'], how='left')
+        return PortfolioOptimizer.construct(full_df, sign, self.cfg, self.writer,
+                                            assume_unique=self.loader.inputs_clean())
+
+    def run_strategy(self, sign, score_df, returns_df):
+        """单个策略: 合并收益 -> 组合构建 -> 绩效分析 -> 保存指标"""
         # 组合构建
-        port_df = PortfolioOptimizer.construct(full_df)
-        
+        port_df = self.build_portfolio(sign, score_df, returns_df)
+
         # 绩效分析
-        metrics = PerformanceAnalyzer.analyze(port_df)
-        
-        summary_file = Config.DIR_REPORTS / f"Summary_{Config.SIGN}.csv"
+        profit = PerformanceAnalyzer.daily_profit(port_df, self.cfg)
+        metrics = PerformanceAnalyzer.analyze(port_df, sign, profit, self.cfg, self.writer)
+
+        # 显著性检验
+        if self.cfg.SIG_RESAMPLES > 0:
+            SignificanceTester.run(port_df, profit, sign, self.cfg)
+
+        # 收益归因
+        if self.cfg.RUN_ATTRIBUTION:
+            factor_df = self.load_factor_columns(self.cfg.ATTRIBUTION_FACTORS)
+            PerformanceAttribution.run(port_df, factor_df, sign, self.cfg)
+
+        # 风险报告
+        if self.cfg.RUN_RISK_REPORT:
+            factor_df = self.load_factor_columns(self.cfg.RISK_FACTORS)
+            RiskModel.report(port_df, factor_df, sign, self.cfg)
+
+        summary_file = self.cfg.DIR_REPORTS / f"Summary_{sign}.csv"
         pd.DataFrame([metrics]).to_csv(str(summary_file), index=False, encoding='utf_8_sig')
-        
+        return metrics, summary_file
+
+    def run(self):
+        t0 = time.time()
+        batch_mode = bool(self.strategies)
+        strategies = self.strategies if batch_mode else {self.cfg.SIGN: FactorEngine.calculate_score}
+
+        scores, returns_df = self.load_scores(strategies)
+        if scores is None:
+            return
+        if not scores:
+            print("错误: 未能生成有效数据。")
+            return
+
+        if self.loader.validator is not None:
+            validation_file = self.cfg.DIR_REPORTS / f"Validation_{self.cfg.STOCK_POOL}_{self.cfg.SIGN}.csv"
+            self.loader.validator.summary().to_csv(str(validation_file), index=False, encoding='utf_8_sig')
+            print(f"输入校验: {'通过' if self.loader.inputs_clean() else '存在未去重的重复键或日历外交易日，组合构建将去重'} ({validation_file})")
+
+        print("\n>>> 合并全样本数据...")
+        results = {}
+        for sign in list(scores):
+            if batch_mode:
+                print(f"\n{'-'*40}\n>>> [Batch] 策略: {sign}\n{'-'*40}")
+            # 逐个弹出，处理完即释放该策略的得分数据
+            metrics, summary_file = self.run_strategy(sign, scores.pop(sign), returns_df)
+            results[sign] = metrics
+
+        if batch_mode:
+            summary_file = self.cfg.DIR_REPORTS / f"Summary_Batch_{self.cfg.STOCK_POOL}.csv"
+            compare_df = pd.DataFrame.from_dict(results, orient='index')
+            compare_df.index.name = 'SIGN'
+            compare_df.reset_index().to_csv(str(summary_file), index=False, encoding='utf_8_sig')
+
+        self.writer.wait()
         print(f"\n{'='*40}")
         print(f"回测完成! 总耗时: {time.time()-t0:.2f}s")
-        print(f"年化收益: {metrics.get('RY', 0):.2%}")
+        for sign, metrics in results.items():
+            prefix = f"[{sign}] " if batch_mode else ""
+            print(f"{prefix}年化收益: {metrics.get('RY', 0):.2%}")
         print(f"指标文件: {summary_file}")
+        return results
+
+def run_backtest(cfg=None, strategies=None, **overrides):
+    """
+    以函数方式运行一次回测，不修改 Config 类属性
+    cfg: 基础配置实例 (为空时使用默认值)；overrides: 在其上覆盖的配置项
+    strategies: {SIGN: score_func}，传入时进入批量模式
+    """
+    cfg = (cfg or Config()).replace(**overrides)
+    runner = BacktestRunner(cfg)
+    for sign, score_func in (strategies or {}).items():
+        runner.register(sign, score_func)
+    return runner.run()
+
+def run_many(configs, workers=None):
+    """
+    并行运行多组配置 (如参数扫描)，每组配置在独立进程中运行
+    configs: Config 实例列表；workers: 进程数，为空时取 Config.N_WORKERS
+    输出文件按 (输出目录, SIGN) 命名，多组配置的输出目标重复时报错，参数扫描时应为每组配置设置不同的 SIGN 或 RESULTS_DIR
+    return: 与 configs 顺序一致的结果列表
+    """
+    targets = {}
+    for i, cfg in enumerate(configs):
+        for directory in (cfg.DIR_PORTFOLIO, cfg.DIR_REPORTS):
+            key = (str(Path(directory).resolve()), cfg.SIGN)
+            if key in targets:
+                raise ValueError(f"配置 {targets[key]} 与 {i} 的输出目标重复: {key[0]} / SIGN={cfg.SIGN}")
+            targets[key] = i
+
+    workers = workers or Config.N_WORKERS
+    if workers > 1 and len(configs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(configs))) as pool:
+            return list(pool.map(run_backtest, configs))
+    return [run_backtest(cfg) for cfg in configs]
+
+def _parse_override(text):
+    """解析 --set KEY=VALUE: 默认值为字符串的配置项保持字符串，其余按 Python 字面量解析"""
+    if '=' not in text:
+        raise argparse.ArgumentTypeError(f"格式应为 KEY=VALUE: {text}")
+    name, value = text.split('=', 1)
+    name = name.strip()
+    if name not in Config.option_names():
+        raise argparse.ArgumentTypeError(f"未知的配置项: {name}")
+    if not isinstance(getattr(Config, name), str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+    return name, value
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="量化策略回测")
+    parser.add_argument('--start', dest='START_DATE', help="开始日期，如 20220101")
+    parser.add_argument('--end', dest='END_DATE', help="结束日期，如 20250218")
+    parser.add_argument('--pool', dest='STOCK_POOL', help=f"股票池: {', '.join(Config.POOL_MAPPING)} 或状态文件中的股票池列名")
+    parser.add_argument('--ret-idx', dest='RET_IDX', help="收益口径: open5twap | c2c")
+    parser.add_argument('--sign', dest='SIGN', help="策略标识")
+    parser.add_argument('--factors', dest='ADDITIONAL_FACTORS', nargs='*', help="额外因子文件名 (不含后缀)")
+    parser.add_argument('--workers', dest='N_WORKERS', type=int, help="并行进程数")
+    parser.add_argument('--cache', choices=['reuse', 'rerun'], help="reuse: 复用得分缓存 | rerun: 强制重算")
+    parser.add_argument('--data-dir', dest='DATA_DIR', help="数据目录")
+    parser.add_argument('--results-dir', dest='RESULTS_DIR', help="结果目录")
+    parser.add_argument('--mode', choices=['backtest', 'walk-forward'], default='backtest', help="运行模式")
+    parser.add_argument('--set', dest='overrides', action='append', default=[], type=_parse_override,
+                        metavar='KEY=VALUE', help="覆盖任意配置项，可重复，如 --set TOP_N=50")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    overrides = {k: v for k, v in vars(args).items() if k.isupper() and v is not None}
+    if args.cache:
+        overrides['FORCE_RERUN'] = args.cache == 'rerun'
+    overrides.update(dict(args.overrides))
+    cfg = Config(**overrides)
+
+    if args.mode == 'walk-forward':
+        # 延迟导入: walk_forward 依赖本模块
+        from walk_forward import WalkForwardRunner
+        return WalkForwardRunner(cfg=cfg).run()
+    return run_backtest(cfg)
 
 if __name__ == "__main__":
-    runner = BacktestRunner()
-    runner.run()
\ No newline at end of file
+    main()
@@ -2,6 +2,9 @@
 import pandas as pd
 import numpy as np
 from config import Config
+from risk_model import RiskModel
+from utils import segment_zscore
+from holdings_io import HoldingsStore
 
 class PortfolioOptimizer:
     
@@ -110,12 +113,40 @@ class PortfolioOptimizer:
         return df['weight']
 
     @staticmethod
-    def adjust_untradable(df):
+    def rebalance_flags(trading_days, cfg=None):
+        """按 cfg.REBALANCE_FREQ 标记调仓日 (每个周期的首个交易日)，trading_days 须升序"""
+        cfg = cfg or Config()
+        freq = cfg.REBALANCE_FREQ
+        days = pd.DatetimeIndex(trading_days)
+        if freq == 'D':
+            return np.ones(len(days), dtype=bool)
+        if freq not in ('W', 'M'):
+            raise ValueError(f"未知的调仓频率: {freq}")
+        periods = days.to_period(freq)
+        return np.r_[True, periods[1:] != periods[:-1]]
+
+    @staticmethod
+    def adjust_untradable(df, rebalance_flags=None, cfg=None):
         """
         处理停牌/无法交易的股票 (使用 Pivot 向量化方法)
+        同一遍状态传递中处理调仓规则:
+          - 非调仓日沿用上一日持仓；当日已不在股票池中的股票 (含停牌) 清仓，其余股票重新归一化
+          - 调仓日按 REBALANCE_BUFFER / REBALANCE_SPEED 向目标权重移动；
+            缓冲带只作用于已持有且目标权重非 0 的股票 (新建仓与清仓总是执行)，带内股票保持原权重；
+            归一化只作用于实际交易的股票，并截断到剩余预算 (1 - 停牌继承 - 缓冲带内权重)，总仓位不超过 1；
+            目标为 0 的残余仓位低于尾部阈值时直接清仓
+          - MAX_WEIGHT: 行业中性化与归一化之后再次对可交易股票截断，超出部分留作现金
+            (停牌无法卖出的继承仓位不受限制)
+        rebalance_flags: 与排序后交易日对齐的布尔数组，为空表示每日调仓
         """
         print(">>> [Portfolio] 开始计算权重继承 (Pivot方法)...")
+        cfg = cfg or Config()
         trading_days = sorted(df['TradingDay'].unique())
+        if rebalance_flags is None:
+            rebalance_flags = np.ones(len(trading_days), dtype=bool)
+        buffer = cfg.REBALANCE_BUFFER
+        speed = cfg.REBALANCE_SPEED
+        partial = buffer > 0 or speed < 1
         
         # 1. Pivot 展开
         weight_pivot = df.pivot(index='TradingDay', columns='SecuCode', values='weight').fillna(0)
@@ -130,35 +161,68 @@ class PortfolioOptimizer:
         w_vals = weight_pivot.values
         s_vals = swing_pivot.values 
         sel_vals = selected_pivot.values
+
+        # 当日是否在股票池中 (SwingStatus 缺失处填 0，不能据此区分停牌与出池)
+        in_pool = df.assign(_in_pool=1.0).pivot(index='TradingDay', columns='SecuCode', values='_in_pool')
+        in_pool_vals = in_pool.sort_index().fillna(0).values > 0
+
+        cap = cfg.MAX_WEIGHT
+        if cap is not None and len(trading_days):
+            over = (s_vals[0, :] == 1) & (w_vals[0, :] > cap)
+            w_vals[0, over] = cap
         
         # 2. 循环处理
         for i in range(1, len(trading_days)):
             last_w = w_vals[i-1, :]
             curr_swing = s_vals[i, :] 
             curr_sel = sel_vals[i, :]
+            # 缓冲带内不交易的股票，不参与归一化
+            fixed = np.zeros(len(last_w), dtype=bool)
+
+            if not rebalance_flags[i]:
+                # 非调仓日: 沿用上一日持仓
+                w_vals[i, :] = np.where(in_pool_vals[i, :], last_w, 0.0)
+                curr_sel = (w_vals[i, :] > 0).astype(int)
+            elif partial:
+                # 调仓日: 仅对当日在池且可交易的股票应用缓冲带与渐进调仓
+                movable = in_pool_vals[i, :] & (curr_swing == 1)
+                target = w_vals[i, :]
+                # 目标为 0 的残余仓位低于 (REBALANCE_TAIL_RATIO / 目标持仓数) 时直接清仓，避免几何衰减的长尾
+                tail_floor = cfg.REBALANCE_TAIL_RATIO / max(np.count_nonzero(target > 0), 1)
+                if buffer > 0:
+                    # 缓冲带只抑制已有持仓的小幅调整: 目标为 0 的小仓位需要清仓，新建仓不能因目标权重小于缓冲带而被挡住
+                    fixed = movable & (target > 0) & (last_w > 0) & (np.abs(target - last_w) < buffer)
+                    target = np.where(fixed, last_w, target)
+                if speed < 1:
+                    moved = last_w + speed * (target - last_w)
+                    residual = (target == 0) & (moved < tail_floor)
+                    target = np.where(movable & ~fixed & ~residual, moved, target)
+                w_vals[i, :] = target
+                curr_sel = ((curr_sel == 1) | (target > 0)).astype(int)
             
             # 找出不可交易的股票 (SwingStatus=0)
-            # 如果昨日持有权重 > 0 且今日不可交易，则强制继承权重
-            untradable_idx = (curr_swing == 0) & (last_w > 0)
+            # 如果昨日持有权重 > 0 且今日不可交易，则强制继承权重 (当日已不在股票池中的除外)
+            untradable_idx = (curr_swing == 0) & (last_w > 0) & in_pool_vals[i, :]
             
             w_vals[i, untradable_idx] = last_w[untradable_idx]
             
             total_untradable_w = np.sum(w_vals[i, untradable_idx])
             if total_untradable_w > 1.0: total_untradable_w = 1.0
             
-            # 调整可交易且被选中的股票权重
-            adjustable_idx = (curr_sel == 1) & (curr_swing == 1)
+            # 调整可交易且被选中的股票权重 (缓冲带内的股票保持不变)
+            adjustable_idx = (curr_sel == 1) & (curr_swing == 1) & ~fixed
             
-            scaling_factor = 1.0 - total_untradable_w
-            # 只有当 scaling_factor 有意义且有股票可调时才计算
-            if scaling_factor >= 0:
-                # 归一化当前的选中股票权重 (因为经过行业中性化后 sum 可能不完全是1)
-                current_sel_sum = np.sum(w_vals[i, adjustable_idx])
-                if current_sel_sum > 0:
-                    w_vals[i, adjustable_idx] = (w_vals[i, adjustable_idx] / current_sel_sum) * scaling_factor
-                else:
-                    # 极端情况：全是停牌股，或者没有选出票
-                    pass
+            # 剩余预算截断到 [0, 1]: 停牌继承与缓冲带内权重已占满 (含浮点误差) 时，可调股票权重为 0
+            scaling_factor = max(1.0 - total_untradable_w - np.sum(w_vals[i, fixed]), 0.0)
+            # 归一化当前的选中股票权重 (因为经过行业中性化后 sum 可能不完全是1)
+            current_sel_sum = np.sum(w_vals[i, adjustable_idx])
+            if current_sel_sum > 0:
+                w_vals[i, adjustable_idx] = (w_vals[i, adjustable_idx] / current_sel_sum) * scaling_factor
+
+            # 单票上限: 截断后的剩余部分留作现金，次日沿用时同样生效
+            if cap is not None:
+                over = (curr_swing == 1) & (w_vals[i, :] > cap)
+                w_vals[i, over] = cap
 
         # 3. 还原回长表
         new_weight_df = pd.DataFrame(w_vals, index=weight_pivot.index, columns=weight_pivot.columns)
@@ -174,13 +238,133 @@ class PortfolioOptimizer:
         return df
 
     @staticmethod
-    def construct(scored_df):
-        """组合构建主流程"""
+    def rank_within_day(values, day_codes, valid):
+        """
+        日内降序排名 (从 1 开始，同分按行顺序)，valid=False 的行返回 0
+        一次 lexsort 完成 (交易日, -得分) 排序，排名 = 排序后位置 - 所在交易日段起点
+        """
+        rank = np.zeros(len(values), dtype=np.int64)
+        idx = np.flatnonzero(valid)
+        if len(idx) == 0:
+            return rank
+        codes = day_codes[idx]
+        order = np.lexsort((-values[idx], codes))
+        sorted_codes = codes[order]
+        seg_start = np.searchsorted(sorted_codes, sorted_codes, side='left')
+        rank[idx[order]] = np.arange(len(order)) - seg_start + 1
+        return rank
+
+    @staticmethod
+    def cap_weights(weight, day_codes, n_days, cap, max_iter=20):
+        """
+        单票权重上限: 超出部分按比例分配给同日未触顶的股票，全部日期同时迭代
+        若当日股票数 * cap < 1，则剩余部分无法分配 (总权重 < 1)
+        """
+        w = weight.copy()
+        for _ in range(max_iter):
+            over = w > cap + 1e-12
+            if not over.any():
+                break
+            excess = np.bincount(day_codes, weights=np.where(over, w - cap, 0.0), minlength=n_days)
+            w[over] = cap
+            free = (w > 0) & (w < cap - 1e-12)
+            free_sum = np.bincount(day_codes, weights=np.where(free, w, 0.0), minlength=n_days)
+            scale = np.divide(excess, free_sum, out=np.zeros(n_days), where=free_sum > 0)
+            w[free] = w[free] * (1.0 + scale[day_codes[free]])
+        return w
+
+    @staticmethod
+    def init_weights(df, cfg=None):
+        """
+        选股 + 初始权重 (df 须已按 TradingDay 排序，且已有 NextIndexTrade 列)
+        return: (selected 0/1 数组, weight 数组)
+        """
+        cfg = cfg or Config()
+        day_codes, days = pd.factorize(df['TradingDay'], sort=True)
+        n_days = len(days)
+        score = df['factor_score'].to_numpy(dtype=float)
+        tradable = (df['NextIndexTrade'] == 1).to_numpy()
+
+        # 1. 选股
+        select_mode = cfg.SELECT_MODE
+        if select_mode == 'threshold':
+            sel = tradable & (score >= cfg.SCORE_THRESHOLD)
+        elif select_mode in ('top_n', 'top_pct'):
+            valid = tradable & ~np.isnan(score)
+            rank = PortfolioOptimizer.rank_within_day(score, day_codes, valid)
+            if select_mode == 'top_n':
+                limit = np.full(n_days, cfg.TOP_N)
+            else:
+                n_valid = np.bincount(day_codes[valid], minlength=n_days)
+                limit = np.ceil(n_valid * cfg.TOP_PCT)
+            sel = valid & (rank <= limit[day_codes])
+        else:
+            raise ValueError(f"未知的选股方式: {select_mode}")
+
+        # 2. 原始权重
+        weight_mode = cfg.WEIGHT_MODE
+        if weight_mode == 'equal':
+            raw = np.ones(len(df))
+        elif weight_mode == 'score':
+            # 负分不参与加权；若当日选中股票得分全部 <= 0，下面退化为等权
+            raw = np.clip(np.nan_to_num(score), 0, None)
+        elif weight_mode == 'rank':
+            # 排名靠前权重更高: 第 1 名权重 n，最后一名权重 1
+            rank = PortfolioOptimizer.rank_within_day(score, day_codes, sel)
+            n_sel = np.bincount(day_codes[sel], minlength=n_days)
+            raw = (n_sel[day_codes] - rank + 1).astype(float)
+        else:
+            raise ValueError(f"未知的加权方式: {weight_mode}")
+        raw = np.where(sel, raw, 0.0)
+
+        raw_sum = np.bincount(day_codes, weights=raw, minlength=n_days)
+        sel_count = np.bincount(day_codes, weights=sel.astype(float), minlength=n_days)
+        degenerate = (raw_sum <= 0) & (sel_count > 0)
+        if degenerate.any():
+            raw = np.where(sel & degenerate[day_codes], 1.0, raw)
+            raw_sum = np.bincount(day_codes, weights=raw, minlength=n_days)
+
+        # 3. 归一化 + 单票上限
+        weight = np.divide(raw, raw_sum[day_codes], out=np.zeros(len(df)), where=sel)
+        if cfg.MAX_WEIGHT is not None:
+            weight = PortfolioOptimizer.cap_weights(weight, day_codes, n_days, cfg.MAX_WEIGHT)
+
+        return sel.astype(int), weight
+
+    @staticmethod
+    def report_exposure_breaches(df, limits):
+        """统计最终持仓的实际风格暴露超过 EXPOSURE_LIMITS 的交易日比例"""
+        day_codes, days = pd.factorize(df['TradingDay'], sort=True)
+        n_days = len(days)
+        w = df['weight'].fillna(0).to_numpy(dtype=float)
+        s = np.bincount(day_codes, weights=w, minlength=n_days)
+        z = segment_zscore(df[list(limits)].to_numpy(dtype=float), day_codes, n_days)
+        rows = {}
+        for j, (col, limit) in enumerate(limits.items()):
+            a = np.bincount(day_codes, weights=w * z[:, j], minlength=n_days)
+            exposure = np.divide(a, s, out=np.zeros(n_days), where=s > 0)
+            breach = np.abs(exposure) > limit + 1e-6
+            rows[col] = {'BreachDays': int(breach.sum()), 'BreachRate': breach.mean() if n_days else 0.0,
+                         'MaxAbsExposure': np.abs(exposure).max() if n_days else 0.0}
+            print(f">>> [Portfolio] 最终持仓 {col} 暴露超限: {breach.sum()}/{n_days} 天, "
+                  f"最大 |暴露| {rows[col]['MaxAbsExposure']:.3f} (上限 {limit})")
+        return rows
+
+    @staticmethod
+    def construct(scored_df, sign=None, cfg=None, writer=None, assume_unique=False):
+        """
+        组合构建主流程 (sign 为空时使用 cfg.SIGN)
+        writer: holdings_io.BackgroundWriter，传入时持仓文件在后台线程写入
+        assume_unique: 输入已校验为 (TradingDay, SecuCode) 唯一时跳过去重
+        """
         print(">>> [Portfolio] 开始构建组合...")
+        cfg = cfg or Config()
+        sign = sign or cfg.SIGN
         
         # [防卫性编程]：确保没有重复索引和重复数据
         # 必须确保 TradingDay + SecuCode 是唯一的，否则后续 pivot 会报错
-        df = scored_df.drop_duplicates(subset=['TradingDay', 'SecuCode']).copy()
+        # 输入已校验唯一时跳过 (sort_values 返回新表，不会修改调用方数据)
+        df = scored_df if assume_unique else scored_df.drop_duplicates(subset=['TradingDay', 'SecuCode'])
         
         # 强制排序，确保 groupby 的顺序和 df 的顺序在逻辑上是一致的
         df = df.sort_values(by=['TradingDay', 'SecuCode'])
@@ -197,28 +381,25 @@ class PortfolioOptimizer:
         )
         df.loc[condition, 'NextIndexTrade'] = 1
         
-        # 2. 选中股票
+        # 2. 调仓日 (非调仓日跳过选股、加权与行业中性化，持仓由 adjust_untradable 沿用)
+        trading_days = np.sort(df['TradingDay'].unique())
+        rebalance_flags = PortfolioOptimizer.rebalance_flags(trading_days, cfg)
+        reb_mask = df['TradingDay'].isin(trading_days[rebalance_flags])
+        print(f">>> [Portfolio] 调仓频率: {cfg.REBALANCE_FREQ} | 调仓日 {rebalance_flags.sum()}/{len(trading_days)}")
+
+        # 3. 选股与初始权重 (按日向量化)
+        print(f">>> [Portfolio] 选股与初始权重 (Select={cfg.SELECT_MODE}, Weight={cfg.WEIGHT_MODE})...")
         df['selected'] = 0
-        sel_mask = (df['factor_score'] >= 1) & (df['NextIndexTrade'] == 1)
-        df.loc[sel_mask, 'selected'] = 1
-        
-        # 3. 初始等权
-        print(">>> [Portfolio] 计算初始等权...")
-        def _init_equal_weight(group):
-            selected_mask = group['selected'] == 1
-            count = selected_mask.sum()
-            w = pd.Series(0.0, index=group.index)
-            if count > 0:
-                w[selected_mask] = 1.0 / count
-            return w
-
-        df['weight'] = df.groupby('TradingDay', group_keys=False).apply(_init_equal_weight)
+        df['weight'] = 0.0
+        selected, weight = PortfolioOptimizer.init_weights(df[reb_mask], cfg)
+        df.loc[reb_mask, 'selected'] = selected
+        df.loc[reb_mask, 'weight'] = weight
         
         # 4. 行业中性化
-        print(f">>> [Portfolio] 执行行业中性化约束 (Tol={Config.INDUSTRY_TOL})...")
+        print(f">>> [Portfolio] 执行行业中性化约束 (Tol={cfg.INDUSTRY_TOL})...")
         # 这里的 weights 索引将和 df 严格对齐
-        weights = df.groupby('TradingDay', group_keys=False).apply(
-            lambda x: PortfolioOptimizer.check_industry(x, Config.INDUSTRY_TOL)
+        weights = df[reb_mask].groupby('TradingDay', group_keys=False).apply(
+            lambda x: PortfolioOptimizer.check_industry(x, cfg.INDUSTRY_TOL)
         )
         
         # --- [关键修复] ---
@@ -227,17 +408,41 @@ class PortfolioOptimizer:
             print(">>> [Warning] weights index has duplicates! Keeping first occurrence.")
             weights = weights[~weights.index.duplicated()]
             
-        df['weight'] = weights
+        df.loc[reb_mask, 'weight'] = weights
         # -----------------
+
+        # 4b. 风格暴露约束 (需要 df 中含有对应因子列)
+        # 约束作用于调仓日的目标权重；停牌继承、非调仓日沿用与归一化之后的实际暴露在第 5 步后统计
+        limits = {c: v for c, v in cfg.EXPOSURE_LIMITS.items() if c in df.columns}
+        if limits:
+            print(f">>> [Portfolio] 执行风格暴露约束: {limits}")
+            reb_df = df[reb_mask]
+            weight, infeasible = RiskModel.apply_exposure_limits(
+                reb_df, limits, eligible=(reb_df['NextIndexTrade'] == 1).to_numpy(), max_weight=cfg.MAX_WEIGHT
+            )
+            df.loc[reb_mask, 'weight'] = weight
+            # 约束可能纳入原先未选中的低暴露股票
+            df.loc[reb_mask, 'selected'] = ((reb_df['selected'] == 1).to_numpy() | (weight > 0)).astype(int)
+            if infeasible:
+                print(f">>> [Warning] {infeasible} 个调仓日无法在单票上限内满足暴露约束")
+        elif cfg.EXPOSURE_LIMITS:
+            print(f">>> [Warning] 暴露约束因子 {list(cfg.EXPOSURE_LIMITS)} 不在数据中，跳过")
         
         # 5. 不可交易调整
         print(">>> [Portfolio] 调整不可交易股票仓位...")
-        df = PortfolioOptimizer.adjust_untradable(df)
+        df = PortfolioOptimizer.adjust_untradable(df, rebalance_flags, cfg)
+        if limits:
+            PortfolioOptimizer.report_exposure_breaches(df, limits)
         
         # 6. 保存结果
-        filename = f"Portfolio_{Config.STOCK_POOL}_{Config.SIGN}.csv"
-        save_path = Config.DIR_PORTFOLIO / filename
-        print(f"保存每日持仓: {save_path}")
-        df.to_csv(str(save_path), index=False, encoding='utf_8_sig')
+        if cfg.OUTPUT_FORMAT == 'parquet':
+            save_path = cfg.DIR_PORTFOLIO / f"Portfolio_{cfg.STOCK_POOL}_{sign}.parquet"
+            print(f"保存每日持仓 (非零权重): {save_path}")
+            HoldingsStore.save_holdings(df, save_path, writer)
+        else:
+            filename = f"Portfolio_{cfg.STOCK_POOL}_{sign}.csv"
+            save_path = cfg.DIR_PORTFOLIO / filename
+            print(f"保存每日持仓: {save_path}")
+            df.to_csv(str(save_path), index=False, encoding='utf_8_sig')
         
         return df
\ No newline at end of file
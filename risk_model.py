@@ -0,0 +1,217 @@
+import pandas as pd
+import numpy as np
+from config import Config
+from utils import segment_zscore, cross_section_ols
+
+DAYS_PER_YEAR = 242
+
+class RiskModel:
+    """
+    简易风格因子风险模型
+      - 因子收益: 逐日截面回归 ret = a + sum(f_k * z_k) + e (z 为截面标准化的 RISK_FACTORS)
+      - 因子协方差: 因子收益外积的 EWMA，逐日递推更新 (RISK_HALFLIFE)
+      - 特异风险: 个股残差平方的 EWMA，同样逐日递推
+    预测第 t 日风险时只使用 t-1 日及以前的估计，避免未来信息
+    """
+
+    @staticmethod
+    def _ewm_decay(halflife):
+        return 1 - 0.5 ** (1.0 / halflife)
+
+    @staticmethod
+    def estimate(panel, factor_cols, cfg=None):
+        """
+        panel: 含 TradingDay, SecuCode, 收益列与因子列的长表 (全股票池)
+        return: (days, 因子收益 (n_days, K+1), 预测协方差 (n_days, K+1, K+1), 每行预测特异方差)
+        """
+        cfg = cfg or Config()
+        ret_col = 'ret_open5twap' if cfg.RET_IDX == 'open5twap' else 'ret_c2c'
+        day_codes, days = pd.factorize(panel['TradingDay'], sort=True)
+        n_days = len(days)
+        ret = panel[ret_col].to_numpy(dtype=float)
+        valid = ~np.isnan(ret)
+
+        # 1. 因子收益与残差 (批量截面回归)
+        z = segment_zscore(panel.loc[valid, factor_cols].to_numpy(dtype=float), day_codes[valid], n_days)
+        X = np.column_stack([np.ones(len(z)), z])
+        f, resid = cross_section_ols(ret[valid], X, day_codes[valid], n_days)
+        k = f.shape[1]
+
+        # 2. 因子协方差: 外积的 EWMA (pandas ewm 为递推实现)，整体后移一天作为 t 日的事前估计
+        alpha = RiskModel._ewm_decay(cfg.RISK_HALFLIFE)
+        outer = (f[:, :, None] * f[:, None, :]).reshape(n_days, k * k)
+        cov = pd.DataFrame(outer).ewm(alpha=alpha, adjust=False).mean().shift(1)
+        cov = cov.to_numpy().reshape(n_days, k, k)
+
+        # 3. 特异方差: 残差平方按股票做 EWMA，停牌/缺失日沿用上一次估计
+        resid_sq = pd.DataFrame({
+            'TradingDay': panel['TradingDay'].to_numpy()[valid],
+            'SecuCode': panel['SecuCode'].to_numpy()[valid],
+            'resid_sq': resid ** 2,
+        })
+        spec = resid_sq.pivot(index='TradingDay', columns='SecuCode', values='resid_sq').sort_index()
+        spec = spec.ewm(alpha=alpha, adjust=False, ignore_na=True).mean().shift(1).ffill()
+        spec = spec.reindex(index=pd.DatetimeIndex(days, name='TradingDay'))
+
+        # 映射回每一行；无历史的股票取当日截面中位数
+        spec_var = spec.stack().rename('spec_var').reset_index()
+        spec_var = panel[['TradingDay', 'SecuCode']].merge(spec_var, on=['TradingDay', 'SecuCode'], how='left')['spec_var'].to_numpy()
+        day_median = spec.median(axis=1).to_numpy()
+        spec_var = np.where(np.isnan(spec_var), day_median[day_codes], spec_var)
+        return pd.DatetimeIndex(days), f, cov, np.nan_to_num(spec_var)
+
+    @staticmethod
+    def report(port_df, factor_df, sign=None, cfg=None):
+        """
+        每日组合风险报告: 主动暴露、事前跟踪误差 (年化) 与各因子/特异风险贡献
+        基准与 PerformanceAnalyzer 一致，为当日有收益股票的等权组合
+        """
+        print(">>> [Risk] 开始估计风险模型...")
+        cfg = cfg or Config()
+        sign = sign or cfg.SIGN
+        factor_cols = [c for c in cfg.RISK_FACTORS if c in factor_df.columns]
+        if not factor_cols:
+            print(f"警告: 风险因子 {cfg.RISK_FACTORS} 均不存在，跳过风险报告")
+            return None
+
+        ret_col = 'ret_open5twap' if cfg.RET_IDX == 'open5twap' else 'ret_c2c'
+        panel = pd.merge(
+            port_df[['TradingDay', 'SecuCode', 'weight', ret_col]],
+            factor_df[['TradingDay', 'SecuCode'] + factor_cols],
+            on=['TradingDay', 'SecuCode'], how='left'
+        ).sort_values(['TradingDay', 'SecuCode']).reset_index(drop=True)
+
+        days, f, cov, spec_var = RiskModel.estimate(panel, factor_cols, cfg)
+        n_days = len(days)
+        day_codes = np.searchsorted(days.values, panel['TradingDay'].values)
+
+        valid = panel[ret_col].notna().to_numpy()
+        pool_n = np.bincount(day_codes[valid], minlength=n_days)
+        w_bench = np.where(valid, 1.0 / np.maximum(pool_n[day_codes], 1), 0.0)
+        active_w = panel['weight'].fillna(0).to_numpy(dtype=float) - w_bench
+
+        # 主动暴露 (含截距项)
+        z = segment_zscore(panel[factor_cols].to_numpy(dtype=float), day_codes, n_days)
+        X = np.column_stack([np.ones(len(z)), z])
+        exposure = np.column_stack([
+            np.bincount(day_codes, weights=active_w * X[:, j], minlength=n_days) for j in range(X.shape[1])
+        ])
+
+        # 风险分解: factor_var = a' C a, specific_var = sum(active_w^2 * spec_var)
+        ca = np.einsum('dij,dj->di', cov, exposure)
+        factor_rc = exposure * ca
+        specific_var = np.bincount(day_codes, weights=active_w ** 2 * spec_var, minlength=n_days)
+        total_var = factor_rc.sum(axis=1) + specific_var
+
+        names = ['intercept'] + factor_cols
+        result = pd.DataFrame({
+            'TradingDay': days,
+            'TE': np.sqrt(np.clip(total_var, 0, None) * DAYS_PER_YEAR),
+            'factor_var': factor_rc.sum(axis=1),
+            'specific_var': specific_var,
+        })
+        share = np.divide(factor_rc, total_var[:, None], out=np.zeros_like(factor_rc), where=total_var[:, None] > 0)
+        for j, name in enumerate(names):
+            result[f'exp_{name}'] = exposure[:, j]
+            result[f'rc_{name}'] = share[:, j]
+        result['rc_specific'] = np.divide(specific_var, total_var, out=np.zeros(n_days), where=total_var > 0)
+
+        # 预热期: 首日没有协方差历史 (估计整体后移一天)，此后 RISK_WARMUP_DAYS 内 EWMA 样本不足，不输出
+        warmup = min(max(int(cfg.RISK_WARMUP_DAYS), 1), n_days)
+        result = result.iloc[warmup:].reset_index(drop=True)
+        print(f">>> [Risk] 跳过预热期 {warmup} 个交易日")
+        if result.empty:
+            print("警告: 交易日数不超过预热期，风险报告为空")
+
+        path = cfg.DIR_REPORTS / f"Risk_{cfg.STOCK_POOL}_{sign}.csv"
+        result.to_csv(str(path), index=False, encoding='utf_8_sig')
+        print(f">>> [Risk] 平均事前跟踪误差: {result['TE'].mean():.2%}, 保存: {path}")
+        return result
+
+    @staticmethod
+    def apply_exposure_limits(df, limits, eligible=None, max_weight=None, max_iter=50, tol=1e-9):
+        """
+        风格暴露约束: 对暴露 sum(w * z) / sum(w) 超限的交易日，逐日求解带上下界的最小调整 (二次规划)
+            min sum (w - w0)^2
+            s.t. sum(w) = sum(w0),  sum(w * z_k) = sign * limit_k * sum(w0) (仅超限因子),  0 <= w <= u
+        KKT 条件下未触界股票 w = w0 - lam - sum(mu_k * z_k)：在未触界股票上按日解 (1+K) 维线性方程组，
+        越界股票固定在边界后重新求解 (active set)，全部交易日批量计算，不会因一步过大而清空持仓
+          - 候选股票: eligible 为真的行 (为空时为全部行)，可纳入原先未持有的低暴露股票，而不是把仓位集中到少数股票
+          - u: 单票上限，取当日初始最大权重的 2 倍 (持仓数不少于原持仓数的一半)，max_weight 给定时取两者较小值
+        df: 已按 TradingDay 排序、含 weight 与 limits 中因子列的长表
+        return: (调整后的权重数组, 仍未满足约束的交易日数)
+        """
+        day_codes, days = pd.factorize(df['TradingDay'], sort=True)
+        n_days = len(days)
+        w0 = df['weight'].fillna(0).to_numpy(dtype=float)
+        total = np.bincount(day_codes, weights=w0, minlength=n_days)
+        eligible = np.ones(len(df), dtype=bool) if eligible is None else np.asarray(eligible, dtype=bool)
+        eligible = eligible | (w0 > 0)
+
+        cols = [c for c in limits if c in df.columns]
+        limit = np.array([limits[c] for c in cols], dtype=float)
+        z = segment_zscore(df[cols].to_numpy(dtype=float), day_codes, n_days)
+        X = np.column_stack([np.ones(len(z)), z])
+        k = X.shape[1]
+
+        day_max = np.zeros(n_days)
+        np.maximum.at(day_max, day_codes, w0)
+        upper = 2 * day_max
+        if max_weight is not None:
+            upper = np.minimum(upper, max_weight)
+        u = upper[day_codes]
+
+        def exposure(w):
+            s = np.bincount(day_codes, weights=w, minlength=n_days)
+            a = np.column_stack([np.bincount(day_codes, weights=w * z[:, j], minlength=n_days) for j in range(len(cols))])
+            return np.divide(a, s[:, None], out=np.zeros_like(a), where=s[:, None] > 0)
+
+        # 生效的约束 (只增不减) 与目标暴露
+        active = np.zeros((n_days, len(cols)), dtype=bool)
+        target = np.zeros((n_days, len(cols)))
+        at_lo = ~eligible
+        at_hi = np.zeros(len(df), dtype=bool)
+        w = w0.copy()
+        for _ in range(max_iter):
+            expo = exposure(w)
+            breach = (np.abs(expo) > limit + 1e-6) & ~active
+            free = ~at_lo & ~at_hi
+            bound_viol = free & ((w < -tol) | (w > u + tol))
+            if not breach.any() and not bound_viol.any():
+                break
+            target = np.where(breach, np.sign(expo) * limit, target)
+            active |= breach
+            at_lo |= bound_viol & (w < 0)
+            at_hi |= bound_viol & (w > u)
+            free = ~at_lo & ~at_hi
+            fixed_val = np.where(at_hi, u, 0.0)
+
+            # A x = b, x = [lam, mu_1..mu_K]; A_ab = sum_free X_a X_b
+            # b_a = sum_free w0 X_a + sum_fixed fixed_val X_a - rhs_a, rhs = [s, target * s]
+            A = np.zeros((n_days, k, k))
+            b = np.zeros((n_days, k))
+            rhs = np.column_stack([total, target * total[:, None]])
+            base = np.where(free, w0, fixed_val)
+            for a_ in range(k):
+                b[:, a_] = np.bincount(day_codes, weights=base * X[:, a_], minlength=n_days) - rhs[:, a_]
+                for b_ in range(a_, k):
+                    v = np.bincount(day_codes, weights=np.where(free, X[:, a_] * X[:, b_], 0.0), minlength=n_days)
+                    A[:, a_, b_] = v
+                    A[:, b_, a_] = v
+            # 未生效的因子约束: mu_k = 0
+            off = np.column_stack([np.zeros(n_days, dtype=bool), ~active])
+            A[off] = 0.0
+            A[:, np.arange(k), np.arange(k)] += off
+            b[off] = 0.0
+            x = np.einsum('dij,dj->di', np.linalg.pinv(A), b)
+
+            solved = np.where(free, w0 - np.einsum('nk,nk->n', X, x[day_codes]), fixed_val)
+            day_active = active.any(axis=1)[day_codes]
+            w = np.where(day_active, solved, w0)
+
+        # 数值误差与未收敛处的越界截断后保持当日总仓位
+        w = np.clip(w, 0, u)
+        s = np.bincount(day_codes, weights=w, minlength=n_days)
+        w = w * np.divide(total, s, out=np.zeros(n_days), where=s > 0)[day_codes]
+        infeasible = int((np.abs(exposure(w)) > limit + 1e-4).any(axis=1).sum())
+        return w, infeasible
@@ -0,0 +1,193 @@
+import pandas as pd
+import numpy as np
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+DAYS_PER_YEAR = 242
+CHUNK_ELEMENTS = 10_000_000   # 每批重抽样矩阵的元素数上限，控制内存占用
+
+# 进程池子进程内的共享只读数组: 由 initializer 每个子进程只传一次，避免随任务重复序列化
+# 仅在子进程中赋值，主进程串行执行时直接传参
+_WORKER_SHARED = {}
+
+def _init_worker(shared):
+    _WORKER_SHARED.update(shared)
+
+def _call_in_worker(args):
+    func, task = args
+    return func(_WORKER_SHARED, task)
+
+def _series_metrics(net, excess):
+    """
+    按行批量计算指标，口径同 PerformanceAnalyzer.summarize
+    net / excess: (n_resamples, n_days) 的每日净收益 / 超额收益矩阵
+    """
+    ann = np.sqrt(DAYS_PER_YEAR)
+    net_mean, net_std = net.mean(axis=1), net.std(axis=1, ddof=1)
+    exc_mean, exc_std = excess.mean(axis=1), excess.std(axis=1, ddof=1)
+    return {
+        'RY': net_mean * DAYS_PER_YEAR,
+        'Sharpe': np.divide(net_mean * DAYS_PER_YEAR, net_std * ann,
+                            out=np.zeros_like(net_mean), where=net_std > 0),
+        'AnnExcess': exc_mean * DAYS_PER_YEAR,
+        'IR': np.divide(exc_mean * DAYS_PER_YEAR, exc_std * ann,
+                        out=np.zeros_like(exc_mean), where=exc_std > 0),
+        'WinRate': (excess > 0).mean(axis=1),
+    }
+
+def _bootstrap_chunk(shared, task):
+    """一批循环块 bootstrap: 块起点随机，块内连续取样以保留收益的自相关"""
+    n_resamples, block_size, seed = task
+    net, excess = shared['net'], shared['excess']
+    rng = np.random.default_rng(seed)
+    n = len(net)
+    n_blocks = -(-n // block_size)
+    starts = rng.integers(0, n, size=(n_resamples, n_blocks))
+    idx = ((starts[:, :, None] + np.arange(block_size)) % n).reshape(n_resamples, -1)[:, :n]
+    return _series_metrics(net[idx], excess[idx])
+
+def _random_portfolio_chunk(shared, task):
+    """
+    一批随机等权组合: 每日从可交易股票中抽取与策略当日持仓数相同的股票
+    所有交易日的抽样拼成一个 (n_resamples, sum(k)) 矩阵，用 reduceat 按日分段求均值
+    抽样为有放回抽样，持仓数远小于可交易股票数时与无放回几乎无差别
+    """
+    n_resamples, seed = task
+    returns, day_offset, day_count, k = (shared[key] for key in ('returns', 'day_offset', 'day_count', 'k'))
+    rng = np.random.default_rng(seed)
+    active = k > 0
+    if not active.any():
+        return np.zeros(n_resamples)
+    seg_day = np.repeat(np.flatnonzero(active), k[active])
+    u = rng.random((n_resamples, len(seg_day)))
+    idx = day_offset[seg_day] + (u * day_count[seg_day]).astype(np.int64)
+    seg_start = np.r_[0, np.cumsum(k[active])[:-1]]
+    daily = np.zeros((n_resamples, len(k)))
+    daily[:, active] = np.add.reduceat(returns[idx], seg_start, axis=1) / k[active]
+    return daily.mean(axis=1) * DAYS_PER_YEAR
+
+class SignificanceTester:
+    """
+    回测指标的显著性检验
+      - 块 bootstrap: 对每日 origin_profit / profit 重抽样，给出 RY、Sharpe、AnnExcess、IR、WinRate 的置信区间与单侧 p 值
+      - 随机组合零分布: 从当日可交易股票 (NextIndexTrade == 1) 中随机选股等权持有，检验策略毛收益是否显著优于随机选股
+    """
+    # 各指标在原假设下的取值
+    NULL_VALUES = {'RY': 0.0, 'Sharpe': 0.0, 'AnnExcess': 0.0, 'IR': 0.0, 'WinRate': 0.5}
+
+    @staticmethod
+    def _run_chunks(func, shared, tasks, n_workers):
+        """n_workers > 1 时使用进程池，否则串行执行"""
+        if n_workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks)),
+                                     initializer=_init_worker, initargs=(shared,)) as pool:
+                return list(pool.map(_call_in_worker, [(func, task) for task in tasks]))
+        return [func(shared, task) for task in tasks]
+
+    @staticmethod
+    def _chunk_sizes(n_resamples, row_len):
+        """按每行长度拆分重抽样批次，使单批矩阵不超过 CHUNK_ELEMENTS"""
+        chunk = int(min(max(CHUNK_ELEMENTS // max(row_len, 1), 1), n_resamples))
+        sizes = [chunk] * (n_resamples // chunk)
+        if n_resamples % chunk:
+            sizes.append(n_resamples % chunk)
+        return sizes
+
+    @staticmethod
+    def bootstrap(profit, n_resamples, block_size, seed, n_workers=1):
+        """
+        块 bootstrap
+        return: {指标: 重抽样分布数组}
+        """
+        net = profit['origin_profit'].to_numpy(dtype=float)
+        excess = profit['profit'].to_numpy(dtype=float)
+        sizes = SignificanceTester._chunk_sizes(n_resamples, len(net))
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        tasks = [(size, block_size, s) for size, s in zip(sizes, seeds)]
+        shared = {'net': net, 'excess': excess}
+        parts = SignificanceTester._run_chunks(_bootstrap_chunk, shared, tasks, n_workers)
+        return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+    @staticmethod
+    def random_portfolios(port_df, n_resamples, seed, n_workers=1, cfg=None):
+        """
+        随机组合零分布 (年化毛收益)
+        return: (零分布数组, 策略年化毛收益)
+        """
+        cfg = cfg or Config()
+        ret_col = 'ret_open5twap' if cfg.RET_IDX == 'open5twap' else 'ret_c2c'
+        df = port_df[['TradingDay', 'weight', 'NextIndexTrade', ret_col]]
+        days = np.sort(df['TradingDay'].unique())
+        day_codes = np.searchsorted(days, df['TradingDay'].to_numpy())
+
+        # 策略每日毛收益与持仓数
+        strat_ret = np.bincount(day_codes, weights=(df['weight'] * df[ret_col]).fillna(0).to_numpy(),
+                                minlength=len(days))
+        k = np.bincount(day_codes, weights=(df['weight'] > 0).to_numpy(dtype=float),
+                        minlength=len(days)).astype(np.int64)
+
+        # 可交易股票按日连续排列
+        universe = ((df['NextIndexTrade'] == 1) & df[ret_col].notna()).to_numpy()
+        order = np.argsort(day_codes[universe], kind='stable')
+        returns = df[ret_col].to_numpy(dtype=float)[universe][order]
+        day_count = np.bincount(day_codes[universe], minlength=len(days))
+        day_offset = np.r_[0, np.cumsum(day_count)[:-1]]
+        k = np.minimum(k, day_count)
+
+        sizes = SignificanceTester._chunk_sizes(n_resamples, k.sum())
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        tasks = [(size, s) for size, s in zip(sizes, seeds)]
+        shared = {'returns': returns, 'day_offset': day_offset, 'day_count': day_count, 'k': k}
+        null_ry = np.concatenate(SignificanceTester._run_chunks(_random_portfolio_chunk, shared, tasks, n_workers))
+        return null_ry, strat_ret.mean() * DAYS_PER_YEAR
+
+    @staticmethod
+    def run(port_df, profit, sign=None, cfg=None):
+        """
+        port_df: PortfolioOptimizer.construct 的结果
+        profit: PerformanceAnalyzer.daily_profit 的结果
+        """
+        print(">>> [Significance] 开始显著性检验...")
+        t0 = time.time()
+        cfg = cfg or Config()
+        sign = sign or cfg.SIGN
+        n_resamples = cfg.SIG_RESAMPLES
+        alpha = 1 - cfg.SIG_CONF_LEVEL
+
+        profit = profit.sort_values('TradingDay').reset_index(drop=True)
+        observed = {k: v[0] for k, v in _series_metrics(
+            profit['origin_profit'].to_numpy(dtype=float)[None, :],
+            profit['profit'].to_numpy(dtype=float)[None, :]
+        ).items()}
+
+        rows = []
+        boot = SignificanceTester.bootstrap(profit, n_resamples, cfg.SIG_BLOCK_SIZE, cfg.SIG_SEED, cfg.N_WORKERS)
+        for name, dist in boot.items():
+            # 平移法: 将 bootstrap 分布平移到原假设取值处，得到单侧 p 值 (H1: 指标大于原假设值)
+            null_dist = dist - observed[name] + SignificanceTester.NULL_VALUES[name]
+            rows.append({
+                'Metric': name,
+                'Method': 'block_bootstrap',
+                'Observed': observed[name],
+                'CI_Low': np.quantile(dist, alpha / 2),
+                'CI_High': np.quantile(dist, 1 - alpha / 2),
+                'PValue': (np.sum(null_dist >= observed[name]) + 1) / (n_resamples + 1),
+            })
+
+        # 随机组合一行的 CI 为零分布区间，而非策略指标的置信区间
+        null_ry, strat_ry = SignificanceTester.random_portfolios(port_df, n_resamples, cfg.SIG_SEED + 1, cfg.N_WORKERS, cfg)
+        rows.append({
+            'Metric': 'GrossRY',
+            'Method': 'random_portfolio',
+            'Observed': strat_ry,
+            'CI_Low': np.quantile(null_ry, alpha / 2),
+            'CI_High': np.quantile(null_ry, 1 - alpha / 2),
+            'PValue': (np.sum(null_ry >= strat_ry) + 1) / (n_resamples + 1),
+        })
+
+        result = pd.DataFrame(rows)
+        path = cfg.DIR_REPORTS / f"Significance_{cfg.STOCK_POOL}_{sign}.csv"
+        result.to_csv(str(path), index=False, encoding='utf_8_sig')
+        print(f">>> [Significance] 重抽样 {n_resamples} 次, 耗时 {time.time()-t0:.2f}s, 保存: {path}")
+        return result
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from config import Config
+from portfolio import PortfolioOptimizer
+
+def holdings_frame(days):
+    """days: 每日 {SecuCode: (weight, SwingStatus, selected)}，未列出的股票当日不在股票池中"""
+    rows = []
+    for day, names in zip(pd.bdate_range('2023-01-02', periods=len(days)), days):
+        for code, (weight, swing, selected) in names.items():
+            rows.append({'TradingDay': day, 'SecuCode': code, 'weight': weight,
+                         'SwingStatus': swing, 'selected': selected})
+    return pd.DataFrame(rows)
+
+def weight_panel(df):
+    return df.pivot(index='TradingDay', columns='SecuCode', values='weight').fillna(0)
+
+def test_buffer_never_exceeds_full_investment():
+    # 缓冲带内权重 + 停牌继承权重比 1 多一个浮点误差: 新建仓应为 0，总仓位不超过 1
+    suspended = np.nextafter(0.2, 1.0)
+    df = holdings_frame([
+        {'A': (0.8, 1, 1), 'C': (suspended, 1, 1)},
+        {'A': (0.801, 1, 1), 'C': (0.0, 0, 0), 'D': (0.5, 1, 1)},
+    ])
+    cfg = Config(REBALANCE_BUFFER=0.02, MAX_WEIGHT=None)
+    panel = weight_panel(PortfolioOptimizer.adjust_untradable(df, cfg=cfg))
+    day = panel.iloc[1]
+    assert day['A'] == 0.8
+    assert day['C'] == suspended
+    assert day['D'] == 0.0
+    assert (panel.sum(axis=1) <= 1.0 + 1e-12).all()
+
+def test_buffer_does_not_keep_zero_target_positions():
+    # 目标为 0 且低于缓冲带的小仓位应被清仓，而不是永久保留；新建仓 D 得到释放出的预算
+    df = holdings_frame([
+        {'A': (0.5, 1, 1), 'B': (0.497, 1, 1), 'C': (0.003, 1, 1)},
+        {'A': (0.5, 1, 1), 'B': (0.494, 1, 1), 'C': (0.0, 1, 0), 'D': (0.01, 1, 1)},
+    ])
+    cfg = Config(REBALANCE_BUFFER=0.005, REBALANCE_SPEED=0.5, MAX_WEIGHT=None)
+    panel = weight_panel(PortfolioOptimizer.adjust_untradable(df, cfg=cfg))
+    day = panel.iloc[1]
+    assert day['C'] == 0.0
+    assert (day['A'], day['B']) == (0.5, 0.497)
+    assert np.isclose(day['D'], 0.003)
+
+def test_non_rebalance_day_drops_names_leaving_pool():
+    # 非调仓日 B 不在股票池中: 清仓 B，A 归一化到满仓，B 次日回到股票池也不会恢复
+    df = holdings_frame([
+        {'A': (0.5, 1, 1), 'B': (0.5, 1, 1)},
+        {'A': (0.5, 1, 1)},
+        {'A': (0.5, 1, 1), 'B': (0.5, 1, 1)},
+    ])
+    flags = np.array([True, False, False])
+    panel = weight_panel(PortfolioOptimizer.adjust_untradable(df, flags, Config(MAX_WEIGHT=None)))
+    assert np.allclose(panel['A'].to_numpy(), [0.5, 1.0, 1.0])
+    assert np.allclose(panel['B'].to_numpy(), [0.5, 0.0, 0.0])
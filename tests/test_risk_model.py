@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from risk_model import RiskModel
+from utils import segment_zscore
+
+def tilted_cross_section(n_days=5, n_names=400, n_held=60, seed=0):
+    """每日从 n_names 只股票中等权持有风格因子最高的 n_held 只 (强烈正向倾斜)"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for d, day in enumerate(pd.bdate_range('2023-01-02', periods=n_days)):
+        style = rng.standard_normal(n_names)
+        held = np.argsort(-(style + 0.5 * rng.standard_normal(n_names)))[:n_held]
+        weight = np.zeros(n_names)
+        weight[held] = 1.0 / n_held
+        frames.append(pd.DataFrame({
+            'TradingDay': day,
+            'SecuCode': [f"{i:06d}" for i in range(n_names)],
+            'style': style,
+            'weight': weight,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def daily_stats(df, w):
+    day_codes, days = pd.factorize(df['TradingDay'], sort=True)
+    n_days = len(days)
+    z = segment_zscore(df['style'].to_numpy(), day_codes, n_days)
+    s = np.bincount(day_codes, weights=w, minlength=n_days)
+    exposure = np.bincount(day_codes, weights=w * z, minlength=n_days) / s
+    n_hold = np.bincount(day_codes, weights=(w > 1e-12).astype(float), minlength=n_days)
+    max_w = pd.Series(w).groupby(day_codes).max().to_numpy()
+    return s, exposure, n_hold, max_w
+
+def test_exposure_limit_on_tilted_cross_section():
+    df = tilted_cross_section()
+    _, before, _, _ = daily_stats(df, df['weight'].to_numpy())
+    assert (before > 0.5).all()
+
+    w, infeasible = RiskModel.apply_exposure_limits(df, {'style': 0.05})
+    s, exposure, n_hold, max_w = daily_stats(df, w)
+
+    assert infeasible == 0
+    assert np.allclose(s, 1.0)
+    assert (np.abs(exposure) <= 0.05 + 1e-6).all()
+    assert (n_hold >= 30).all()
+    assert (max_w <= 2 / 60 + 1e-12).all()
+
+def test_exposure_limit_within_held_names_keeps_the_book():
+    """只能在原持仓内调整时，也不会清空持仓或把仓位集中到个别股票"""
+    df = tilted_cross_section()
+    held = df['weight'].to_numpy() > 0
+    w, _ = RiskModel.apply_exposure_limits(df, {'style': 0.05}, eligible=held)
+    s, exposure, n_hold, max_w = daily_stats(df, w)
+
+    assert np.allclose(s, 1.0)
+    assert (w[~held] == 0).all()
+    assert (n_hold >= 30).all()
+    assert (max_w <= 2 / 60 + 1e-12).all()
@@ -1,23 +1,28 @@
+import os
 import hashlib
+import threading
+from pathlib import Path
 import pandas as pd
 import numpy as np
 from config import Config
 
-def get_config_identifier():
-    """生成包含额外因子的唯一标识符"""
+def get_config_identifier(sign=None, cfg=None):
+    """生成包含额外因子的唯一标识符 (sign 为空时使用 cfg.SIGN，批量回测时按策略分别生成)"""
+    cfg = cfg or Config()
+    sign = sign or cfg.SIGN
     components = [
-        f"sd:{Config.START_DATE}",
-        f"ed:{Config.END_DATE}",
-        f"pool:{Config.STOCK_POOL}",
-        f"ret:{Config.RET_IDX}"
-        f"sign:{Config.SIGN}"
-        f"add:{Config.ADDITIONAL_FACTORS}"
+        f"sd:{cfg.START_DATE}",
+        f"ed:{cfg.END_DATE}",
+        f"pool:{cfg.STOCK_POOL}",
+        f"ret:{cfg.RET_IDX}"
+        f"sign:{sign}"
+        f"add:{cfg.ADDITIONAL_FACTORS}"
     ]
     
     # [新增] 将额外因子列表加入哈希
-    if Config.ADDITIONAL_FACTORS:
+    if cfg.ADDITIONAL_FACTORS:
         # 排序确保列表顺序不影响哈希 ('A','B' 和 'B','A' 应视为相同配置)
-        factors_str = ",".join(sorted(Config.ADDITIONAL_FACTORS))
+        factors_str = ",".join(sorted(cfg.ADDITIONAL_FACTORS))
         components.append(f"add_factors:{factors_str}")
     
     combined_str = ";".join(components)
@@ -25,6 +30,21 @@ def get_config_identifier():
     hasher.update(combined_str.encode('utf-8'))
     return hasher.hexdigest()[:8]
 
+def atomic_write(path, write_func):
+    """
+    原子写文件: write_func(临时路径) 写入同目录下的临时文件后 os.replace 到目标路径
+    并行运行共享缓存目录时，读取方不会读到写了一半的文件
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        write_func(tmp)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
+
 def format_secucode(code):
     if pd.isna(code): return None
     try:
@@ -35,7 +55,11 @@ def format_secucode(code):
 def mquantiles(data, q):
     data = np.asarray(data).flatten()
     data = data[~np.isnan(data)]
-    n = len(data)
+    return quantile_sorted(np.sort(data), q)
+
+def quantile_sorted(sorted_data, q):
+    """mquantiles 的预排序版本: sorted_data 须为已剔除 NaN 的升序数组"""
+    n = len(sorted_data)
     if n == 0: return np.nan
     r = q * n - 1
     k = np.floor(r + 0.5).astype(int)
@@ -43,5 +67,46 @@ def mquantiles(data, q):
     r = r - k
     k = np.clip(k, 0, n - 1)
     kp1 = np.clip(kp1, 0, n - 1)
-    sorted_data = np.sort(data)
-    return (0.5 + r) * sorted_data[kp1] + (0.5 - r) * sorted_data[k]
\ No newline at end of file
+    return (0.5 + r) * sorted_data[kp1] + (0.5 - r) * sorted_data[k]
+
+def segment_zscore(values, day_codes, n_days):
+    """
+    按交易日截面标准化 (values: (N,) 或 (N, K))，NaN 视为缺失不参与统计，标准化后填 0 (即截面均值)
+    """
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    out = np.zeros_like(values)
+    for j in range(values.shape[1]):
+        x = values[:, j]
+        valid = ~np.isnan(x)
+        cnt = np.bincount(day_codes[valid], minlength=n_days)
+        s1 = np.bincount(day_codes[valid], weights=x[valid], minlength=n_days)
+        s2 = np.bincount(day_codes[valid], weights=x[valid] ** 2, minlength=n_days)
+        mean = np.divide(s1, cnt, out=np.zeros(n_days), where=cnt > 0)
+        var = np.divide(s2, cnt, out=np.zeros(n_days), where=cnt > 0) - mean ** 2
+        std = np.sqrt(np.clip(var, 0, None))
+        z = np.divide(x - mean[day_codes], std[day_codes], out=np.zeros(len(x)),
+                      where=valid & (std[day_codes] > 0))
+        out[:, j] = z
+    return out[:, 0] if squeeze else out
+
+def cross_section_ols(y, X, day_codes, n_days):
+    """
+    逐日截面回归 y = X b + e 的批量解法
+    X'X 与 X'y 按交易日分段求和后一次性求伪逆，避免逐日循环
+    return: (coef: (n_days, K), resid: (N,))
+    """
+    n, k = X.shape
+    xtx = np.zeros((n_days, k, k))
+    xty = np.zeros((n_days, k))
+    for a in range(k):
+        xty[:, a] = np.bincount(day_codes, weights=X[:, a] * y, minlength=n_days)
+        for b in range(a, k):
+            s = np.bincount(day_codes, weights=X[:, a] * X[:, b], minlength=n_days)
+            xtx[:, a, b] = s
+            xtx[:, b, a] = s
+    coef = np.einsum('dij,dj->di', np.linalg.pinv(xtx), xty)
+    resid = y - np.einsum('nk,nk->n', X, coef[day_codes])
+    return coef, resid
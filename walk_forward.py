@@ -0,0 +1,101 @@
+import pandas as pd
+import numpy as np
+import time
+from factor_engine import FactorEngine
+from analysis import PerformanceAnalyzer
+from main import BacktestRunner
+
+class WalkForwardRunner:
+    """
+    滚动 walk-forward 评估
+    全区间只打分 (复用按年得分缓存) 和构建组合一次，各 fold 直接切片复用每日收益明细，
+    因此 fold 之间重叠的交易日不会重复计算；各 fold 是同一条连续持仓路径上的区间，而非各自从空仓起步
+    """
+    def __init__(self, runner=None, sign=None, score_func=None, cfg=None):
+        self.runner = runner or BacktestRunner(cfg)
+        self.cfg = self.runner.cfg
+        self.sign = sign or self.cfg.SIGN
+        self.score_func = score_func or FactorEngine.calculate_score
+
+    @staticmethod
+    def make_folds(trading_days, train_days, test_days, step_days):
+        """按交易日数切分 fold: [train | test]，每次向后滚动 step_days"""
+        for name, value in (('train_days', train_days), ('test_days', test_days), ('step_days', step_days)):
+            if isinstance(value, bool) or not isinstance(value, (int, np.integer)) or value <= 0:
+                raise ValueError(f"{name} 必须为正整数: {value!r}")
+        days = list(trading_days)
+        folds = []
+        start = 0
+        while start + train_days + test_days <= len(days):
+            train = days[start:start + train_days]
+            test = days[start + train_days:start + train_days + test_days]
+            folds.append({
+                'fold': len(folds) + 1,
+                'train_start': train[0], 'train_end': train[-1],
+                'test_start': test[0], 'test_end': test[-1],
+            })
+            start += step_days
+        return folds
+
+    @staticmethod
+    def evaluate_fold(fold, train_profit, test_profit):
+        """计算单个 fold 的样本内 (IS_) / 样本外 (OOS_) 指标"""
+        _, train_metrics = PerformanceAnalyzer.summarize(train_profit, annual=False)
+        _, test_metrics = PerformanceAnalyzer.summarize(test_profit, annual=False)
+        row = dict(fold)
+        row.update({f'IS_{k}': v for k, v in train_metrics.items()})
+        row.update({f'OOS_{k}': v for k, v in test_metrics.items()})
+        return row
+
+    def run(self):
+        t0 = time.time()
+        scores, returns_df = self.runner.load_scores({self.sign: self.score_func})
+        if not scores:
+            print("错误: 未能生成有效数据。")
+            return
+
+        port_df = self.runner.build_portfolio(self.sign, scores.pop(self.sign), returns_df)
+        profit = PerformanceAnalyzer.daily_profit(port_df, self.cfg)
+
+        folds = WalkForwardRunner.make_folds(
+            profit['TradingDay'], self.cfg.WF_TRAIN_DAYS, self.cfg.WF_TEST_DAYS, self.cfg.WF_STEP_DAYS
+        )
+        if not folds:
+            print(f"错误: 交易日数 {len(profit)} 不足一个 fold "
+                  f"(train={self.cfg.WF_TRAIN_DAYS}, test={self.cfg.WF_TEST_DAYS})")
+            return
+
+        # 各 fold 只是每日收益明细的切片，指标计算为微秒级，串行即可 (进程池的启动与序列化开销远大于计算本身)
+        print(f">>> [WalkForward] fold 数: {len(folds)}")
+        days = profit['TradingDay']
+        rows = []
+        test_mask = pd.Series(False, index=profit.index)
+        for fold in folds:
+            train = profit[(days >= fold['train_start']) & (days <= fold['train_end'])]
+            in_test = (days >= fold['test_start']) & (days <= fold['test_end'])
+            test_mask |= in_test
+            rows.append(WalkForwardRunner.evaluate_fold(fold, train, profit[in_test]))
+        report = pd.DataFrame(rows)
+
+        # 汇总: 各 fold 指标的均值/标准差 + 拼接全部样本外区间的整体表现
+        metric_cols = [c for c in report.columns if c.startswith(('IS_', 'OOS_'))]
+        agg = report[metric_cols].agg(['mean', 'std'])
+        agg.insert(0, 'fold', agg.index)
+        _, oos_metrics = PerformanceAnalyzer.summarize(profit[test_mask], annual=False)
+        oos_row = {'fold': 'oos_all'}
+        oos_row.update({f'OOS_{k}': v for k, v in oos_metrics.items()})
+        report = pd.concat([report, agg, pd.DataFrame([oos_row])], ignore_index=True)
+
+        report_file = self.cfg.DIR_REPORTS / f"WalkForward_{self.cfg.STOCK_POOL}_{self.sign}.csv"
+        report.to_csv(str(report_file), index=False, encoding='utf_8_sig')
+        self.runner.writer.wait()
+
+        print(f"\n{'='*40}")
+        print(f"Walk-forward 完成! 总耗时: {time.time()-t0:.2f}s")
+        print(f"样本内 IR 均值: {agg.loc['mean', 'IS_IR']:.2f} | 样本外 IR 均值: {agg.loc['mean', 'OOS_IR']:.2f}")
+        print(f"样本外整体年化收益: {oos_metrics['RY']:.2%}")
+        print(f"报告文件: {report_file}")
+        return report
+
+if __name__ == "__main__":
+    WalkForwardRunner().run()